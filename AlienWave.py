@@ -0,0 +1,235 @@
+from panda3d.core import NodePath, Loader, ClockObject, ConfigVariableDouble, ConfigVariableInt
+import math
+import numpy as np
+from CollideObjectBase import PlacedObject
+from EntityStore import EntityStore, FLAG_ALIVE, FLAG_BODY
+from ObjectPool import ObjectPool
+from EventLog import eventLog
+
+# Missiles fly about 4000 units, so within alien-lod-near every alien they can reach is exactly where it is drawn.
+alienLodNear = ConfigVariableDouble('alien-lod-near', 4000)
+alienLodFar = ConfigVariableDouble('alien-lod-far', 12000)
+alienLodInterval = ConfigVariableInt('alien-lod-interval', 4)  # ticks between updates between near and far
+alienLodMargin = ConfigVariableDouble('alien-lod-margin', 1.2)  # widens the view test so edges don't pop
+
+
+class WaveAlien:
+    """One alien of a wave: its orbit, health and flags are a row of the AlienWave; only its model is its own.
+    Its key, the wave's task name and its own, names it in the broadphase and the scene index."""
+    __slots__ = ('wave', 'modelNode', 'waveRow', 'key')
+    category = "alien"
+
+    def __init__(self, wave, modelNode: NodePath):
+        self.wave = wave
+        self.modelNode = modelNode
+        self.waveRow = -1
+        self.key = None
+
+    @property
+    def health(self) -> float:
+        return float(self.wave.health[self.waveRow])
+
+    def Destroy(self):
+        self.wave.DestroyMany([self])
+
+
+class AlienWave(EntityStore):
+    """Flies any number of aliens in circles around their planets from one simulation system. Orbits are closed
+    form, so every position is known at any time; nodes and collision bodies are written every tick near the
+    viewer, every alien-lod-interval ticks further out while on screen, and otherwise not at all. Aliens that
+    are not written have no collision body, so nothing collides with where they were last drawn."""
+
+    broadphase = None
+    simulation = None
+    explosions = None
+    viewer = None  # whose distance picks each alien's update rate, normally the player's ship
+    camera = None
+    lens = None
+
+    def __init__(self, loader: Loader, parentNode: NodePath, taskMgr, modelPath: str, texPath: str,
+                 scale: float = 2, colRadius: float = 1.5, capacity: int = 64, taskName: str = "alien-wave"):
+        self.loader = loader
+        self.parentNode = parentNode
+        self.modelPath = modelPath
+        self.scale = scale
+        self.colRadius = colRadius * scale * scale  # the solid sits in the model's scaled space
+        self.time = 0.0
+        self.ticks = 0
+        self.stepSize = 0.0
+        self.taskName = taskName
+
+        super().__init__({"anchor": (np.int32, 1), "radius": (np.float32, 1), "phase": (np.float64, 1),
+                          "speed": (np.float64, 1), "height": (np.float32, 1), "positions": (np.float32, 3),
+                          "health": (np.float32, 1), "flags": (np.uint8, 1)}, capacity, rowName="waveRow")
+        self.anchors = []
+        self.anchorIndex = {}
+        self.drawRows = np.zeros(0, dtype=np.int64)
+        self.updates = 0
+
+        # Every alien is an instance of the same model under one root that carries the texture. Destroyed aliens'
+        # models go back to the pool for the next Spawn.
+        self.root = parentNode.attachNewNode(taskName)
+        self.root.setTexture(PlacedObject.LoadTexture(loader, texPath), 1)
+        self.pool = ObjectPool(lambda: WaveAlien(self, PlacedObject.LoadModel(self.loader, self.modelPath)),
+                               reset=self.PlaceAlien, release=self.DetachAlien)
+
+        if AlienWave.simulation is not None:
+            AlienWave.simulation.Add(taskName, self.Step, render=self.Render)
+        else:
+            taskMgr.add(self.Update, taskName)
+
+    def PlaceAlien(self, alien: WaveAlien, name: str):
+        alien.modelNode.reparentTo(self.root)
+        alien.modelNode.setName(name)
+        alien.modelNode.setScale(self.scale)
+        alien.key = self.taskName + "/" + name
+        PlacedObject.Register(alien, alien.key)
+
+    @staticmethod
+    def DetachAlien(alien: WaveAlien):
+        if alien.key is not None:
+            PlacedObject.Unregister(alien.key)
+        alien.modelNode.detachNode()
+
+    def Anchor(self, nodePath: NodePath) -> int:
+        key = nodePath.getKey()
+        if key not in self.anchorIndex:
+            self.anchorIndex[key] = len(self.anchors)
+            self.anchors.append(nodePath)
+        return self.anchorIndex[key]
+
+    def ReadAnchors(self):
+        return np.array([anchor.getPos() for anchor in self.anchors], dtype=np.float32).reshape(-1, 3)
+
+    def Spawn(self, center: NodePath, names, radii, phases, speeds, heights) -> list:
+        """Adds one alien per name circling center, each with its own radius, starting angle in radians,
+        angular speed and height above the center; returns their handles."""
+        handles = [self.pool.Acquire(name) for name in names]
+        rows = self.AddEntities(handles)
+        self.anchor[rows] = self.Anchor(center)
+        self.radius[rows] = radii
+        self.phase[rows] = phases
+        self.speed[rows] = speeds
+        self.height[rows] = heights
+        self.health[rows] = 1
+        self.flags[rows] = FLAG_ALIVE
+
+        positions = self.Positions(np.arange(rows.start, rows.stop), self.time)
+        self.positions[rows] = positions
+        for handle, (x, y, z) in zip(handles, positions.tolist()):
+            handle.modelNode.setPos(x, y, z)
+        if AlienWave.broadphase is not None:
+            self.AddBodies(np.arange(rows.start, rows.stop))
+        return handles
+
+    def Positions(self, rows, time: float, anchors=None):
+        anchors = anchors if anchors is not None else self.ReadAnchors()
+        angle = self.phase[rows] + self.speed[rows] * time
+        positions = anchors[self.anchor[rows]]
+        positions[:, 0] += self.radius[rows] * np.cos(angle)
+        positions[:, 1] += self.radius[rows] * np.sin(angle)
+        positions[:, 2] += self.height[rows]
+        return positions
+
+    def OnScreen(self, positions) -> np.ndarray:
+        if AlienWave.camera is None or AlienWave.lens is None:
+            return np.ones(len(positions), dtype=bool)
+
+        # Row-vector convention: a point in the parent's space times this matrix lands in the camera's space.
+        matrix = np.array(self.parentNode.getMat(AlienWave.camera), dtype=np.float32).reshape(4, 4)
+        local = positions @ matrix[:3, :3] + matrix[3, :3]
+        fov = AlienWave.lens.getFov()
+        margin = alienLodMargin.getValue()
+        depth = np.maximum(local[:, 1], 1e-6)
+        return (local[:, 1] > 0) & (np.abs(local[:, 0]) <= depth * math.tan(math.radians(fov[0] / 2)) * margin) \
+            & (np.abs(local[:, 2]) <= depth * math.tan(math.radians(fov[1] / 2)) * margin)
+
+    def Bands(self, positions):
+        """Returns masks of the near aliens, updated every tick, and of the on-screen aliens short of far,
+        updated every interval ticks."""
+        n = self.count
+        if AlienWave.viewer is None:
+            return np.ones(n, dtype=bool), np.zeros(n, dtype=bool)
+
+        distances = np.linalg.norm(positions - np.asarray(tuple(AlienWave.viewer.getPos(self.parentNode)),
+                                                          dtype=np.float32), axis=1)
+        near = distances < alienLodNear.getValue()
+        middle = ~near & (distances < alienLodFar.getValue())
+        if middle.any():
+            middle[middle] = self.OnScreen(positions[middle])
+        return near, middle
+
+    def AddBodies(self, rows):
+        for row, center in zip(rows.tolist(), self.positions[rows].tolist()):
+            AlienWave.broadphase.AddDynamic(self.handles[row].key, "alien", center, self.colRadius)
+        self.flags[rows] |= FLAG_BODY
+
+    def RemoveBodies(self, rows):
+        for row in rows.tolist():
+            AlienWave.broadphase.Remove(self.handles[row].key)
+        self.flags[rows] &= ~np.uint8(FLAG_BODY)
+
+    def Step(self, dt: float):
+        self.time += dt
+        self.ticks += 1
+        self.stepSize = dt
+        if self.count == 0:
+            return
+
+        # The orbits are closed form: every alien's position is current, only the scene graph lags behind.
+        n = self.count
+        anchors = self.ReadAnchors()
+        self.positions[:n] = self.Positions(np.arange(n), self.time, anchors)
+        near, middle = self.Bands(self.positions[:n])
+
+        # Middle-band aliens are staggered by row so their updates are spread evenly across ticks.
+        interval = max(1, alienLodInterval.getValue())
+        rows = np.flatnonzero(near | (middle & ((np.arange(n) + self.ticks) % interval == 0)))
+        self.drawRows = np.union1d(self.drawRows, rows)
+        self.updates += len(rows)
+
+        if AlienWave.broadphase is not None:
+            banded = near | middle
+            bodies = (self.flags[:n] & FLAG_BODY) != 0
+            self.RemoveBodies(np.flatnonzero(bodies & ~banded))
+            self.AddBodies(np.flatnonzero(banded & ~bodies))
+            for row, center in zip(rows.tolist(), self.positions[rows].tolist()):
+                AlienWave.broadphase.Move(self.handles[row].key, center)
+
+    def Render(self, alpha: float = 1.0):
+        """Places the aliens updated since the last frame where they are alpha of a tick later."""
+        if not len(self.drawRows):
+            return
+        rows = self.drawRows[self.drawRows < self.count]
+        self.drawRows = np.zeros(0, dtype=np.int64)
+        positions = self.Positions(rows, self.time + alpha * self.stepSize)
+        for row, (x, y, z) in zip(rows.tolist(), positions.tolist()):
+            self.handles[row].modelNode.setPos(x, y, z)
+
+    def Update(self, task):
+        # Without a Simulation, advance once per rendered frame.
+        self.Step(ClockObject.getGlobalClock().getDt())
+        self.Render(0.0)
+        return task.cont
+
+    def DestroyMany(self, handles):
+        """Removes every alien in handles that is still alive, exploding them together."""
+        handles = [handle for handle in dict.fromkeys(handles) if handle.waveRow >= 0]
+        if not handles:
+            return
+
+        positions = []
+        for handle in handles:
+            eventLog.Log("alien-destroyed", "%s destroyed!", handle.modelNode.getName())
+            positions.append(tuple(self.positions[handle.waveRow]))
+            if AlienWave.broadphase is not None and self.flags[handle.waveRow] & FLAG_BODY:
+                AlienWave.broadphase.Remove(handle.key)
+            self.RemoveEntity(handle)
+            self.pool.Release(handle)
+
+        if AlienWave.explosions is not None:
+            AlienWave.explosions.ExplodeMany(positions, [self.colRadius] * len(positions))
+
+    def Stats(self) -> dict:
+        return {"aliens": self.count, "ticks": self.ticks, "updates": self.updates,
+                "bodies": int(np.count_nonzero(self.flags[:self.count] & FLAG_BODY)), "pool": self.pool.Stats()}
@@ -0,0 +1,194 @@
+from panda3d.core import Filename, LoaderOptions, NodePath, Texture, TexturePool, SamplerState, PNMImage
+from panda3d.core import Loader as PandaLoader
+import argparse, hashlib, json, os, sys
+
+BUILD_VERSION = 2
+BUILD_DIR = "Build"
+MANIFEST_NAME = "manifest.json"
+MODEL_TYPES = (".x", ".obj", ".3ds", ".egg")
+TEXTURE_TYPES = (".png", ".jpg", ".jpeg")
+PREVIEW_SIZE = 32
+
+builtAssets = None
+
+
+def SourceKey(path: str) -> str:
+    return os.path.normpath(path).replace('\\', '/')
+
+
+def OutputPath(sourcePath: str, buildDir: str = BUILD_DIR) -> str:
+    extension = ".bam" if sourcePath.lower().endswith(MODEL_TYPES) else ".txo"
+    return os.path.join(buildDir, SourceKey(sourcePath) + extension).replace('\\', '/')
+
+
+def PreviewPath(outputPath: str) -> str:
+    return outputPath[:-len(".txo")] + ".preview.txo"
+
+
+def ReadManifest(buildDir: str = BUILD_DIR) -> dict:
+    try:
+        with open(os.path.join(buildDir, MANIFEST_NAME)) as manifestFile:
+            manifest = json.load(manifestFile)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != BUILD_VERSION:
+        return {}
+    return manifest.get("assets", {})
+
+
+def CurrentEntry(path: str):
+    """Returns the manifest entry for a source asset if its build output is up to date, otherwise None."""
+    global builtAssets
+    if builtAssets is None:
+        builtAssets = ReadManifest()
+
+    entry = builtAssets.get(SourceKey(path))
+    if entry is None or not os.path.exists(entry["output"]):
+        return None
+
+    # Size and mtime are enough to notice an edited source without hashing it on every start.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_size != entry["size"] or int(stat.st_mtime) != entry["mtime"]:
+        return None
+
+    return entry
+
+
+def Resolve(path: str) -> str:
+    """Returns the built .bam/.txo for a source asset when it is up to date, otherwise the source path."""
+    entry = CurrentEntry(path)
+    return entry["output"] if entry is not None else path
+
+
+def Preview(path: str):
+    """Returns the built low-resolution preview of a texture, or None if there is no current build of it."""
+    entry = CurrentEntry(path)
+    if entry is None or "preview" not in entry or not os.path.exists(entry["preview"]):
+        return None
+    return entry["preview"]
+
+
+def ContentHash(path: str) -> str:
+    digest = hashlib.sha256(str(BUILD_VERSION).encode())
+    dependencies = [path]
+    if path.lower().endswith(".obj") and os.path.exists(os.path.splitext(path)[0] + ".mtl"):
+        dependencies.append(os.path.splitext(path)[0] + ".mtl")
+
+    for dependency in dependencies:
+        with open(dependency, "rb") as sourceFile:
+            for chunk in iter(lambda: sourceFile.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def BuildModel(sourcePath: str, outputPath: str, buildDir: str = BUILD_DIR):
+    options = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+    node = PandaLoader.getGlobalPtr().loadSync(Filename.fromOsSpecific(sourcePath), options)
+    if node is None:
+        raise IOError("Could not load model " + sourcePath)
+
+    # Point embedded textures at their built .txo, so loading the .bam never decodes a source image.
+    for tex in NodePath(node).findAllTextures():
+        texturePath = SourceKey(os.path.relpath(tex.getFullpath().toOsSpecific()))
+        if texturePath.lower().endswith(TEXTURE_TYPES) and os.path.exists(texturePath):
+            builtPath = Filename.fromOsSpecific(os.path.abspath(OutputPath(texturePath, buildDir)))
+            tex.setFilename(builtPath)
+            tex.setFullpath(builtPath)
+
+    if not NodePath(node).writeBamFile(Filename.fromOsSpecific(outputPath)):
+        raise IOError("Could not write " + outputPath)
+
+
+def BuildTexture(sourcePath: str, outputPath: str):
+    tex = TexturePool.loadTexture(Filename.fromOsSpecific(sourcePath))
+    if tex is None:
+        raise IOError("Could not load texture " + sourcePath)
+
+    # A tiny copy to show while the full texture streams in.
+    image = PNMImage()
+    tex.store(image)
+    small = PNMImage(PREVIEW_SIZE, PREVIEW_SIZE, image.getNumChannels())
+    small.gaussianFilterFrom(1.0, image)
+    preview = Texture()
+    preview.load(small)
+    if not preview.write(Filename.fromOsSpecific(PreviewPath(outputPath))):
+        raise IOError("Could not write " + PreviewPath(outputPath))
+
+    tex.setMinfilter(SamplerState.FT_linear_mipmap_linear)
+    tex.generateRamMipmapImages()
+    compression = Texture.CM_dxt5 if tex.getNumComponents() == 4 else Texture.CM_dxt1
+    if not tex.compressRamImage(compression, Texture.QL_default):
+        print("  " + sourcePath + ": compression unavailable, storing uncompressed mipmaps")
+
+    if not tex.write(Filename.fromOsSpecific(outputPath)):
+        raise IOError("Could not write " + outputPath)
+    TexturePool.releaseTexture(tex)
+
+
+def FindSources(assetDir: str):
+    for root, dirs, files in os.walk(assetDir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(MODEL_TYPES + TEXTURE_TYPES):
+                yield SourceKey(os.path.join(root, name))
+
+
+def Build(assetDir: str = "Assets", buildDir: str = BUILD_DIR, force: bool = False) -> dict:
+    previous = ReadManifest(buildDir)
+    assets = {}
+    counts = {"built": 0, "cached": 0, "failed": 0}
+
+    # Textures first: models refer to the built textures.
+    for sourcePath in sorted(FindSources(assetDir), key=lambda path: path.lower().endswith(MODEL_TYPES)):
+        outputPath = OutputPath(sourcePath, buildDir)
+        contentHash = ContentHash(sourcePath)
+        stat = os.stat(sourcePath)
+        entry = {"hash": contentHash, "output": outputPath, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+        if not sourcePath.lower().endswith(MODEL_TYPES):
+            entry["preview"] = PreviewPath(outputPath)
+
+        old = previous.get(sourcePath)
+        if not force and old is not None and old["hash"] == contentHash and os.path.exists(outputPath):
+            assets[sourcePath] = entry
+            counts["cached"] += 1
+            continue
+
+        os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+        try:
+            if sourcePath.lower().endswith(MODEL_TYPES):
+                BuildModel(sourcePath, outputPath, buildDir)
+            else:
+                BuildTexture(sourcePath, outputPath)
+        except IOError as error:
+            print("  failed: " + str(error))
+            counts["failed"] += 1
+            continue
+
+        print("  built " + outputPath)
+        assets[sourcePath] = entry
+        counts["built"] += 1
+
+    with open(os.path.join(buildDir, MANIFEST_NAME), "w") as manifestFile:
+        json.dump({"version": BUILD_VERSION, "assets": assets}, manifestFile, indent=1, sort_keys=True)
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Assets/ to .bam models and compressed .txo textures.")
+    parser.add_argument("assetDir", nargs="?", default="Assets")
+    parser.add_argument("--out", default=BUILD_DIR, help="build output directory")
+    parser.add_argument("--force", action="store_true", help="rebuild everything, ignoring the hash cache")
+    args = parser.parse_args(argv)
+
+    counts = Build(args.assetDir, args.out, args.force)
+    print(f"{counts['built']} built, {counts['cached']} up to date, {counts['failed']} failed")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
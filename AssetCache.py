@@ -0,0 +1,226 @@
+from panda3d.core import Loader, NodePath, ModelRoot, ModelPool, TexturePool, Texture, ConfigVariableInt
+from direct.stdpy import threading
+from collections import OrderedDict
+import json, os
+import AssetBuild
+
+cacheBudgetMB = ConfigVariableInt('asset-cache-budget-mb', 512)
+
+
+def AssetKey(path: str) -> str:
+    return os.path.normpath(path).replace('\\', '/')
+
+
+def ModelBytes(modelNode: NodePath) -> int:
+    size = 0
+    for geomNode in modelNode.findAllMatches('**/+GeomNode'):
+        for geom in geomNode.node().getGeoms():
+            vertexData = geom.getVertexData()
+            size += sum(vertexData.getArray(i).getDataSizeBytes() for i in range(vertexData.getNumArrays()))
+            size += sum(geom.getPrimitive(i).getDataSizeBytes() for i in range(geom.getNumPrimitives()))
+    return size
+
+
+def TextureBytes(tex: Texture) -> int:
+    # Counts what is actually held in RAM, so compressed, mipmapped .txo textures are charged their real size.
+    if tex.hasRamImage():
+        return sum(tex.getRamMipmapImageSize(i) for i in range(tex.getNumRamMipmapImages()))
+    return tex.estimateTextureMemory()
+
+
+class AssetCache:
+    """Shares one loaded copy of each model and texture, evicting least recently used assets over budget."""
+
+    def __init__(self, loader: Loader, budgetBytes: int = None, taskMgr=None):
+        self.loader = loader
+        self.taskMgr = taskMgr
+        self.budgetBytes = budgetBytes if budgetBytes is not None else cacheBudgetMB.getValue() * 1024 * 1024
+        self.entries = OrderedDict()  # (kind, key) -> (asset, size), least recently used first
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.queued = OrderedDict()  # (kind, key) -> path still waiting for the preload thread
+        self.inflight = {}
+        self.waiting = {}  # (kind, key) -> callbacks from Request, run on the main thread once loaded
+        self.ready = []
+        self.preloading = False
+        self.delivering = False
+        self.placeholder = None
+        self.lock = threading.Lock()
+
+    def LoadModel(self, modelPath: str, copy: bool = False) -> NodePath:
+        """Returns a new root over the cached model: an instance by default, or a private copy if the
+        caller is going to modify the geometry (e.g. flattening it)."""
+        template = self.Lookup("model", modelPath, self.loader.loadModel)
+        if copy:
+            return NodePath(template.node().copySubgraph())
+
+        # Transforms and render state live on the wrapper, so instances of the template never interfere.
+        modelNode = NodePath(ModelRoot(template.getName()))
+        template.instanceTo(modelNode)
+        return modelNode
+
+    def LoadTexture(self, texPath: str) -> Texture:
+        return self.Lookup("texture", texPath, self.loader.loadTexture)
+
+    def Lookup(self, kind: str, path: str, load):
+        entryKey = (kind, AssetKey(path))
+        with self.lock:
+            if entryKey in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(entryKey)
+                return self.entries[entryKey][0]
+
+            # Wait for an asset the preload thread is already reading; otherwise take it off its queue.
+            loading = self.inflight.get(entryKey)
+            if loading is None:
+                self.queued.pop(entryKey, None)
+                self.misses += 1
+
+        if loading is not None:
+            loading.wait()
+            return self.Lookup(kind, path, load)
+
+        return self.Store(entryKey, load(AssetBuild.Resolve(path)))
+
+    def Store(self, entryKey, asset):
+        with self.lock:
+            if entryKey in self.entries:
+                return self.entries[entryKey][0]
+
+            size = ModelBytes(asset) if entryKey[0] == "model" else TextureBytes(asset)
+            self.entries[entryKey] = (asset, size)
+            self.totalBytes += size
+            self.Evict()
+            if entryKey in self.waiting:
+                self.ready.append((entryKey, asset))
+        return asset
+
+    def Evict(self):
+        # Scene nodes keep their own references, so eviction only stops the caches from pinning the asset.
+        while self.totalBytes > self.budgetBytes and len(self.entries) > 1:
+            (kind, key), (asset, size) = self.entries.popitem(last=False)
+            if kind == "model":
+                if isinstance(asset.node(), ModelRoot):
+                    ModelPool.releaseModel(asset.node().getFullpath())
+            else:
+                TexturePool.releaseTexture(asset)
+            self.totalBytes -= size
+            self.evictions += 1
+
+    def Preload(self, manifestPath: str, taskMgr):
+        """Queues every asset listed in a JSON manifest for loading on a background thread."""
+        with open(manifestPath) as manifestFile:
+            manifest = json.load(manifestFile)
+
+        with self.lock:
+            for kind, listName in (("model", "models"), ("texture", "textures")):
+                for path in manifest.get(listName, []):
+                    entryKey = (kind, AssetKey(path))
+                    if entryKey not in self.entries and entryKey not in self.inflight:
+                        self.queued[entryKey] = path
+
+        if self.taskMgr is None:
+            self.taskMgr = taskMgr
+        self.StartPreload()
+
+    def StartPreload(self):
+        with self.lock:
+            if self.preloading or not self.queued:
+                return
+            self.preloading = True
+
+        self.taskMgr.setupTaskChain('asset-preload', numThreads=1)
+        self.taskMgr.add(self.PreloadTask, 'AssetCache-preload', taskChain='asset-preload')
+
+    def PreloadTask(self, task):
+        with self.lock:
+            if not self.queued:
+                self.preloading = False
+                return task.done
+            entryKey, path = self.queued.popitem(last=False)
+            loading = self.inflight[entryKey] = threading.Event()
+
+        try:
+            builtPath = AssetBuild.Resolve(path)
+            if entryKey[0] == "model":
+                asset = self.loader.loadModel(builtPath, okMissing=True)
+            else:
+                asset = TexturePool.loadTexture(builtPath)
+            if asset is not None:
+                self.Store(entryKey, asset)
+        finally:
+            with self.lock:
+                del self.inflight[entryKey]
+            loading.set()
+        return task.cont
+
+    def Request(self, kind: str, path: str, callback) -> bool:
+        """Streams an asset: callback(asset) runs on the main thread once the background thread has read it,
+        ahead of anything merely preloaded. Returns True if the asset was already cached and callback has run."""
+        entryKey = (kind, AssetKey(path))
+        with self.lock:
+            cached = self.entries.get(entryKey)
+            if cached is not None:
+                self.hits += 1
+                self.entries.move_to_end(entryKey)
+            else:
+                self.waiting.setdefault(entryKey, []).append(callback)
+                if entryKey not in self.inflight:
+                    self.queued[entryKey] = path
+                    self.queued.move_to_end(entryKey, last=False)
+
+        if cached is not None:
+            callback(cached[0])
+            return True
+
+        if self.taskMgr is None:
+            self.Lookup(kind, path, self.loader.loadModel if kind == "model" else self.loader.loadTexture)
+            self.Deliver()
+            return True
+
+        self.StartPreload()
+        if not self.delivering:
+            self.delivering = True
+            self.taskMgr.add(self.DeliverTask, 'AssetCache-deliver', sort=-20)
+        return False
+
+    def Deliver(self):
+        with self.lock:
+            ready, self.ready = self.ready, []
+            callbacks = [(asset, self.waiting.pop(entryKey, [])) for entryKey, asset in ready]
+
+        for asset, waiting in callbacks:
+            for callback in waiting:
+                callback(asset)
+
+    def DeliverTask(self, task):
+        self.Deliver()
+        with self.lock:
+            if not self.waiting:
+                self.delivering = False
+                return task.done
+        return task.cont
+
+    def Placeholder(self, texPath: str) -> Texture:
+        """The built low-resolution preview of a texture, or a flat grey texture when there is none."""
+        preview = AssetBuild.Preview(texPath)
+        if preview is not None:
+            return self.Lookup("texture", preview, self.loader.loadTexture)
+
+        if self.placeholder is None:
+            self.placeholder = Texture('placeholder')
+            self.placeholder.setup2dTexture(1, 1, Texture.T_unsigned_byte, Texture.F_rgb)
+            self.placeholder.setRamImage(b'\x80\x80\x80')
+        return self.placeholder
+
+    def Stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.totalBytes,
+            "budgetBytes": self.budgetBytes,
+        }
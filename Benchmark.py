@@ -0,0 +1,232 @@
+from panda3d.core import loadPrcFileData, ClockObject, Vec3
+import argparse, json, os, platform, random, subprocess, sys, tempfile, time
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DRONE_MODEL = "./Assets/DroneDefender/DroneDefender.obj"
+DRONE_TEXTURE = "./Assets/DroneDefender/octotoad1_auv.png"
+ALIEN_MODEL = "Assets/Spaceships/spacejet.3ds"
+ALIEN_TEXTURE = "./Assets/Spaceships/redufo.png"
+
+# name -> (setup function name, count)
+SCENARIOS = {
+    "cold-load": ("SetupColdLoad", 0),
+    "drones-60": ("SetupDrones", 60),
+    "drones-1k": ("SetupDrones", 1000),
+    "drones-10k": ("SetupDrones", 10000),
+    "orbiters-200": ("SetupOrbiters", 200),
+    "aliens-500": ("SetupAliens", 500),
+    "missile-barrage-64": ("SetupMissileBarrage", 64),
+}
+
+
+def PeakRSSBytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def SetupColdLoad(app, count):
+    """The scene as the game builds it, including the drones its own spawn task adds."""
+    return {}
+
+
+def SetupDrones(app, count):
+    import DefensePaths as defensePaths
+    import SpaceJamClasses
+
+    # Replace the game's 60-drone spawn job with count drones in shells around Planet1.
+    app.simulation.Remove("spawn-drones")
+    center = np.asarray(app.Planet1.modelNode.getPos(), dtype=np.float32)
+    shells = defensePaths.rng.uniform(500, 3000, count).astype(np.float32)
+    positions = defensePaths.Cloud.batch(count) * shells[:, None] + center
+
+    names = ["BenchDrone" + str(index) for index in range(count)]
+    start = time.perf_counter()
+    SpaceJamClasses.Drone.SpawnMany(app.loader, DRONE_MODEL, app.render, names, DRONE_TEXTURE, positions,
+                                    np.full(count, 10, dtype=np.float32))
+    return {"spawnMs": (time.perf_counter() - start) * 1000}
+
+
+def SetupOrbiters(app, count):
+    import SpaceJamClasses
+
+    planets = (app.Planet1, app.Planet2, app.Planet3, app.Planet4, app.Planet5, app.Planet6)
+    start = time.perf_counter()
+    for index in range(count):
+        SpaceJamClasses.Orbiter(app.loader, app.taskMgr, DRONE_MODEL, app.render, "BenchOrbiter" + str(index),
+                                Vec3(3, 3, 3), DRONE_TEXTURE, planets[index % len(planets)], 800,
+                                "MLB" if index % 2 == 0 else "Cloud", app.Hero)
+    return {"spawnMs": (time.perf_counter() - start) * 1000}
+
+
+def SetupAliens(app, count):
+    """One wave per planet, count aliens in all. Distances are measured from the station rather than the ship,
+    which the scenario leaves drifting, so each run updates the same aliens."""
+    import DefensePaths as defensePaths
+    from AlienWave import AlienWave
+
+    AlienWave.viewer = app.SpaceStation1.modelNode
+    planets = (app.Planet1, app.Planet2, app.Planet3, app.Planet4, app.Planet5, app.Planet6)
+    waves = []
+    start = time.perf_counter()
+    for index, planet in enumerate(planets):
+        size = count // len(planets) + (index < count % len(planets))
+        wave = AlienWave(app.loader, app.render, app.taskMgr, ALIEN_MODEL, ALIEN_TEXTURE,
+                         taskName="bench-aliens-" + str(index))
+        wave.Spawn(planet.modelNode, ["BenchAlien{}-{}".format(index, alien) for alien in range(size)],
+                   defensePaths.rng.uniform(300, 1500, size), np.arange(size) * 2 * np.pi / size,
+                   defensePaths.rng.uniform(0.2, 1, size), defensePaths.rng.uniform(-200, 200, size))
+        waves.append(wave)
+    return {"spawnMs": (time.perf_counter() - start) * 1000, "waves": waves}
+
+
+def SetupMissileBarrage(app, count):
+    """Fires a volley of count missiles every 30 frames from a ring around the station's drone formation."""
+    launcher = app.Hero.launcher
+    launcher.reloadTime = 0
+    target = app.SpaceStation1.modelNode.getPos()
+    origins = []
+    for index, (x, y, z) in enumerate(np.array(
+            [(np.cos(a), np.sin(a), 0.2) for a in np.linspace(0, 2 * np.pi, count, endpoint=False)])):
+        origin = app.render.attachNewNode("BenchLauncher" + str(index))
+        origin.setPos(target + Vec3(float(x), float(y), float(z)) * 1500)
+        origin.lookAt(target)
+        origins.append(origin)
+
+    from Broadphase import COLLIDES_WITH
+    hits = []
+    for category in COLLIDES_WITH["missile"]:
+        app.collisions.On("missile", category, lambda batch: hits.extend(batch.entries))
+
+    def Volley(task):
+        if task.frame % 30 == 0:
+            for origin in origins:
+                launcher.Fire(origin, task.time)
+        return task.cont
+
+    app.taskMgr.add(Volley, "bench-volley", sort=28)
+    return {"hits": hits}
+
+
+def RunScenario(name: str, frames: int, seed: int, dt: float, windowType: str) -> dict:
+    setupName, count = SCENARIOS[name]
+    loadPrcFileData("", "\n".join([
+        "window-type " + windowType,
+        "audio-library-name null",
+        "frame-profiler 1",
+        "frame-profiler-overlay 0",
+        "missile-pool-size %d" % max(count, 8),
+    ]))
+
+    # Set through the API: clock-mode from config advances frame time but leaves getDt() at zero.
+    clock = ClockObject.getGlobalClock()
+    clock.setMode(ClockObject.MNonRealTime)
+    clock.setFrameRate(1.0 / dt)
+
+    random.seed(seed)
+    import DefensePaths as defensePaths
+    defensePaths.Seed(seed)
+
+    start = time.perf_counter()
+    from Spacejam import MyApp
+    from Startup import startup
+    app = MyApp()
+    app.taskMgr.step()
+    startupMs = (time.perf_counter() - start) * 1000
+
+    extra = globals()[setupName](app, count)
+
+    frameTimes = np.zeros(frames)
+    for frame in range(frames):
+        begin = time.perf_counter()
+        app.taskMgr.step()
+        frameTimes[frame] = time.perf_counter() - begin
+
+    summary = app.profiler.Summary()
+    collision = {key: row for key, row in summary.items() if key.startswith("traverse ")}
+    result = {
+        "scenario": name,
+        "count": count,
+        "frames": frames,
+        "startupMs": startupMs,
+        "firstFrameMs": startup.Summary()["firstFrameMs"],
+        "startupPhasesMs": startup.Summary()["phasesMs"],
+        "frameMeanMs": float(frameTimes.mean() * 1000),
+        "frameP99Ms": float(np.percentile(frameTimes, 99) * 1000),
+        "collisionMsPerFrame": sum(row["totalMs"] for row in collision.values()) / frames,
+        "collision": collision,
+        "peakRSSBytes": PeakRSSBytes(),
+        "assetCache": app.assetCache.Stats(),
+        "simulation": app.simulation.Stats(),
+        "collisionEvents": app.collisions.Stats(),
+    }
+    if "hits" in extra:
+        extra["hits"] = len(extra["hits"])
+    if "waves" in extra:
+        extra["waves"] = [wave.Stats() for wave in extra["waves"]]
+    result.update(extra)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run scripted, fixed-timestep scenarios and record frame costs.")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all): " + ", ".join(SCENARIOS))
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dt", type=float, default=1 / 60)
+    parser.add_argument("--window", default="none", choices=("none", "offscreen"),
+                        help="offscreen renders for real; none skips drawing entirely")
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenario " + ", ".join(unknown))
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    if args.child:
+        result = RunScenario(args.scenarios[0], args.frames, args.seed, args.dt, args.window)
+        with open(args.out, "w") as resultFile:
+            json.dump(result, resultFile)
+        return 0
+
+    # One process per scenario: ShowBase can only be created once, and peak RSS must not carry over.
+    results = []
+    for name in args.scenarios:
+        print("running " + name)
+        handle, childOut = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), name, "--child", "--frames", str(args.frames),
+                            "--seed", str(args.seed), "--dt", str(args.dt), "--window", args.window,
+                            "--out", childOut], check=True, stdout=subprocess.DEVNULL)
+            with open(childOut) as resultFile:
+                result = json.load(resultFile)
+        except (subprocess.CalledProcessError, ValueError) as error:
+            result = {"scenario": name, "error": str(error)}
+        finally:
+            os.remove(childOut)
+
+        results.append(result)
+        if "error" not in result:
+            print(f"  startup {result['startupMs']:.0f} ms, frame {result['frameMeanMs']:.2f} ms mean / "
+                  f"{result['frameP99Ms']:.2f} ms p99, collision {result['collisionMsPerFrame']:.2f} ms/frame")
+        else:
+            print("  failed: " + result["error"])
+
+    with open(args.out, "w") as outFile:
+        json.dump({"seed": args.seed, "dt": args.dt, "frames": args.frames, "window": args.window,
+                   "python": platform.python_version(), "platform": platform.platform(), "results": results},
+                  outFile, indent=1)
+    print("wrote " + args.out)
+    return 1 if any("error" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+from panda3d.core import NodePath, BitMask32, CollisionNode, CollisionSphere, CollisionTraverser, Point3
+from panda3d.core import ConfigVariableDouble
+import math
+
+broadphaseCellSize = ConfigVariableDouble('broadphase-cell-size', 1000)
+
+CATEGORIES = ("universe", "planet", "station", "drone", "missile", "ship", "alien")
+
+# What each category is tested against when it is the moving (from) side of a test.
+COLLIDES_WITH = {
+    "ship": ("universe", "planet", "station", "drone", "alien"),
+    "missile": ("planet", "station", "drone", "alien"),
+    "alien": ("ship", "missile"),
+    "drone": (),
+    "universe": (),
+    "planet": (),
+    "station": (),
+}
+
+
+def CategoryMask(category: str) -> BitMask32:
+    return BitMask32.bit(CATEGORIES.index(category) + 1)
+
+
+def FromMask(category: str) -> BitMask32:
+    mask = BitMask32.allOff()
+    for other in COLLIDES_WITH[category]:
+        mask |= CategoryMask(other)
+    return mask
+
+
+def CategoryOf(collisionNodePath: NodePath) -> str:
+    """Reads a collision node's category back from its into-mask, or None if AssignMasks never set one."""
+    bit = collisionNodePath.node().getIntoCollideMask().getLowestOnBit()
+    return CATEGORIES[bit - 1] if 0 < bit <= len(CATEGORIES) else None
+
+
+def AssignMasks(collisionNodePath: NodePath, category: str):
+    collisionNodePath.node().setIntoCollideMask(CategoryMask(category))
+    collisionNodePath.node().setFromCollideMask(FromMask(category))
+
+
+class CellGroup:
+    """The solids of one category inside one grid cell, kept in a single CollisionNode."""
+    __slots__ = ('nodePath', 'keys', 'index')
+
+    def __init__(self, nodePath: NodePath):
+        self.nodePath = nodePath
+        self.keys = []
+        self.index = {}
+
+
+class Broadphase:
+    """Buckets into-collision solids into a uniform grid under one root, so the traverser's bounding-volume
+    test rejects whole far-away cells before any solid is looked at."""
+
+    def __init__(self, parentNode: NodePath, cellSize: float = None):
+        self.cellSize = cellSize if cellSize is not None else broadphaseCellSize.getValue()
+        self.root = parentNode.attachNewNode('Broadphase')
+        self.cells = {}
+        self.groups = {}  # (cell, category) -> CellGroup
+        self.groupsByNode = {}
+        self.bodies = {}  # key -> [category, cell, radius]
+        self.profiler = None
+
+    def CellOf(self, pos) -> tuple:
+        return (math.floor(pos[0] / self.cellSize), math.floor(pos[1] / self.cellSize),
+                math.floor(pos[2] / self.cellSize))
+
+    def Cell(self, cell: tuple) -> NodePath:
+        if cell not in self.cells:
+            self.cells[cell] = self.root.attachNewNode('cell-%d-%d-%d' % cell)
+        return self.cells[cell]
+
+    def Group(self, cell: tuple, category: str) -> CellGroup:
+        if (cell, category) not in self.groups:
+            nodePath = self.Cell(cell).attachNewNode(CollisionNode(category))
+            AssignMasks(nodePath, category)
+            group = self.groups[(cell, category)] = CellGroup(nodePath)
+            self.groupsByNode[nodePath.getKey()] = group
+        return self.groups[(cell, category)]
+
+    def AddStatic(self, collisionNodePath: NodePath, category: str, key=None):
+        """Moves a body's existing CollisionNode under the cell holding its center; its world transform is kept.
+        key, if given, is what Find returns for hits on it."""
+        AssignMasks(collisionNodePath, category)
+        if key is not None:
+            collisionNodePath.setTag("body", key)
+        bounds = collisionNodePath.getBounds()
+        center = bounds.getCenter() if not bounds.isEmpty() and not bounds.isInfinite() else Point3()
+        center = self.root.getRelativePoint(collisionNodePath, center)
+        collisionNodePath.wrtReparentTo(self.Cell(self.CellOf(center)))
+
+    def AddDynamic(self, key, category: str, center, radius: float):
+        if key in self.bodies:
+            self.Remove(key)
+
+        cell = self.CellOf(center)
+        group = self.Group(cell, category)
+        group.index[key] = len(group.keys)
+        group.keys.append(key)
+        group.nodePath.node().addSolid(CollisionSphere(Point3(*center), radius))
+        self.bodies[key] = [category, cell, radius]
+
+    def Move(self, key, center):
+        category, cell, radius = self.bodies[key]
+        if self.CellOf(center) != cell:
+            self.Remove(key)
+            self.AddDynamic(key, category, center, radius)
+            return
+
+        group = self.groups[(cell, category)]
+        group.nodePath.node().modifySolid(group.index[key]).setCenter(Point3(*center))
+
+    def Resize(self, key, radius: float):
+        body = self.bodies[key]
+        body[2] = radius
+        group = self.groups[(body[1], body[0])]
+        group.nodePath.node().modifySolid(group.index[key]).setRadius(radius)
+
+    def Remove(self, key):
+        category, cell, radius = self.bodies.pop(key)
+        group = self.groups[(cell, category)]
+        cNode = group.nodePath.node()
+        index = group.index.pop(key)
+        last = len(group.keys) - 1
+        if index != last:
+            # Swap the last solid into the hole so indices stay dense.
+            cNode.setSolid(index, cNode.modifySolid(last))
+            moved = group.keys[index] = group.keys[last]
+            group.index[moved] = index
+        cNode.removeSolid(last)
+        group.keys.pop()
+
+    def __contains__(self, key):
+        return key in self.bodies
+
+    def Find(self, entry):
+        """Returns the body key an into-collision entry refers to, or None for static bodies added without one."""
+        intoNodePath = entry.getIntoNodePath()
+        group = self.groupsByNode.get(intoNodePath.getKey())
+        if group is None:
+            return intoNodePath.getTag("body") or None
+
+        cNode = group.nodePath.node()
+        intoSolid = entry.getInto()
+        for index in range(cNode.getNumSolids()):
+            if cNode.getSolid(index) == intoSolid:
+                return group.keys[index]
+        return None
+
+    def Query(self, center, radius: float, categories=None):
+        """Returns the dynamic bodies in cells overlapping the sphere; callers do their own exact test."""
+        low = self.CellOf([c - radius for c in center])
+        high = self.CellOf([c + radius for c in center])
+        found = []
+        for (cell, category), group in self.groups.items():
+            if categories is not None and category not in categories:
+                continue
+            if all(low[i] <= cell[i] <= high[i] for i in range(3)):
+                found.extend(group.keys)
+        return found
+
+    def Traverse(self, traverser: CollisionTraverser):
+        if self.profiler is None:
+            traverser.traverse(self.root)
+            return
+
+        with self.profiler.Measure("traverse " + traverser.getName()):
+            traverser.traverse(self.root)
@@ -1,16 +1,66 @@
 from panda3d.core import PandaNode, Loader, NodePath, CollisionNode, CollisionSphere, CollisionInvSphere, CollisionCapsule, Vec3
+from panda3d.core import ConfigVariableBool
+import AssetBuild
+
+debugCollisions = ConfigVariableBool('debug-collisions', False)  # draws collision solids and traversal contacts
 
 class PlacedObject:  
+    __slots__ = ('modelNode',)
+    assetCache = None
+    sceneIndex = None
+    category = None
+
     def __init__(self, loader: Loader, modelPath: str, parentNode: NodePath, nodeName: str):
-        self.modelNode: NodePath = loader.loadModel(modelPath)
+        self.modelNode: NodePath = PlacedObject.LoadModel(loader, modelPath)
 
         if not isinstance(self.modelNode, NodePath):
             raise AssertionError("PlacedObject loader.loadModel(" + modelPath + ") did not return a proper NodePath!")
         
         self.modelNode.reparentTo(parentNode)
         self.modelNode.setName(nodeName)
+        PlacedObject.Register(self)
+
+    @staticmethod
+    def Register(obj, name: str = None):
+        if PlacedObject.sceneIndex is not None:
+            PlacedObject.sceneIndex.Add(obj, name)
+
+    @staticmethod
+    def Unregister(key):
+        """Takes an object, or the name of one, out of the scene index when it is destroyed or pooled."""
+        if PlacedObject.sceneIndex is not None:
+            PlacedObject.sceneIndex.Remove(key)
+
+    @staticmethod
+    def LoadModel(loader: Loader, modelPath: str, copy: bool = False) -> NodePath:
+        if PlacedObject.assetCache is not None:
+            return PlacedObject.assetCache.LoadModel(modelPath, copy)
+        return loader.loadModel(AssetBuild.Resolve(modelPath))
+
+    @staticmethod
+    def LoadTexture(loader: Loader, texPath: str):
+        if PlacedObject.assetCache is not None:
+            return PlacedObject.assetCache.LoadTexture(texPath)
+        return loader.loadTexture(AssetBuild.Resolve(texPath))
+
+    @staticmethod
+    def StreamTexture(loader: Loader, texPath: str, apply):
+        """Calls apply with a low-resolution placeholder now and again with the full texture once it has
+        been read in the background, so construction never waits on a large image."""
+        cache = PlacedObject.assetCache
+        if cache is None:
+            apply(PlacedObject.LoadTexture(loader, texPath))
+            return
+        if not cache.Request("texture", texPath, apply):
+            apply(cache.Placeholder(texPath))
+
+    def SetTexture(self, tex):
+        if not self.modelNode.isEmpty():
+            self.modelNode.setTexture(tex, 1)
 
 class CollideableObject(PlacedObject):
+    __slots__ = ('collisionNode',)
+
     def __init__(self, loader: Loader, modelPath: str, parentNode: NodePath, nodeName: str):
         super().__init__(loader, modelPath, parentNode, nodeName)
 
@@ -19,18 +69,26 @@ class CollideableObject(PlacedObject):
 
 
 class InverseSphereCollideObject(CollideableObject):
+    __slots__ = ()
+
     def __init__(self, loader: Loader, modelPath: str, parentNode: NodePath, nodeName: str, colPositionVec: Vec3, colRadius: float):
         super(InverseSphereCollideObject, self).__init__(loader, modelPath, parentNode, nodeName)
         self.collisionNode.node().addSolid(CollisionInvSphere(colPositionVec, colRadius))
 
 class SphereCollideObject(CollideableObject):
+    __slots__ = ()
+
     def __init__(self, loader: Loader, modelPath: str, parentNode: NodePath, nodeName: str, colPositionVec: Vec3, colRadius: float):
         super(SphereCollideObject, self).__init__(loader, modelPath, parentNode, nodeName)
         self.collisionNode.node().addSolid(CollisionSphere(colPositionVec, colRadius))
 
 
 class CapsuleCollideableObject(CollideableObject):
+    __slots__ = ()
+
     def __init__(self, loader: Loader, modelPath: str, parentNode: NodePath, nodeName: str, ax: float, ay: float, az: float, bx: float, by: float, bz: float, r: float):
         super(CapsuleCollideableObject, self).__init__(loader, modelPath, parentNode, nodeName)
         self.collisionNode.node().addSolid(CollisionCapsule(ax, ay, az, bx, by, bz, r))
-        self.collisionNode.show()
\ No newline at end of file
+        if debugCollisions.getValue():
+            self.collisionNode.show()
+
\ No newline at end of file
@@ -0,0 +1,78 @@
+from panda3d.core import NodePath, CollisionTraverser, CollisionHandlerQueue
+from Broadphase import CategoryOf
+
+
+class CollisionBatch:
+    """Every entry for one (from, into) category pair in a frame. sources[i] is whatever the caller collected
+    entries[i] for, such as the missile that made the hit, or None."""
+    __slots__ = ('fromCategory', 'intoCategory', 'entries', 'sources')
+
+    def __init__(self, fromCategory: str, intoCategory: str):
+        self.fromCategory = fromCategory
+        self.intoCategory = intoCategory
+        self.entries = []
+        self.sources = []
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CollisionDispatcher:
+    """Collects collision entries from any number of traversals into per-frame batches keyed by the category
+    pair the collide masks name, and hands each batch to that pair's handlers once, at the end of the frame."""
+
+    def __init__(self, taskMgr, sort: int = 40, taskName: str = "collision-dispatch"):
+        self.queue = CollisionHandlerQueue()
+        self.handlers = {}  # (from, into) -> [handler]
+        self.batches = {}
+        self.profiler = None
+
+        self.dispatched = {}  # "from-into" -> entries handed to handlers
+        self.dropped = 0
+
+        taskMgr.add(self.Update, taskName, sort=sort)
+
+    def On(self, fromCategory: str, intoCategory: str, handler):
+        """handler(batch) is called once per frame in which fromCategory hit intoCategory."""
+        self.handlers.setdefault((fromCategory, intoCategory), []).append(handler)
+
+    def AddCollider(self, traverser: CollisionTraverser, collisionNodePath: NodePath):
+        traverser.addCollider(collisionNodePath, self.queue)
+
+    def Add(self, entry, source=None):
+        key = (CategoryOf(entry.getFromNodePath()), CategoryOf(entry.getIntoNodePath()))
+        if key not in self.handlers:
+            self.dropped += 1
+            return
+
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = CollisionBatch(*key)
+        batch.entries.append(entry)
+        batch.sources.append(source)
+
+    def Collect(self, queue: CollisionHandlerQueue = None):
+        """Moves every entry a traversal left in queue (by default the dispatcher's own) into the batches."""
+        queue = queue if queue is not None else self.queue
+        for entry in queue.entries:
+            self.Add(entry)
+        queue.clearEntries()
+
+    def Dispatch(self):
+        batches, self.batches = self.batches, {}
+        for key, batch in batches.items():
+            name = key[0] + "-" + key[1]
+            self.dispatched[name] = self.dispatched.get(name, 0) + len(batch)
+            for handler in self.handlers[key]:
+                if self.profiler is None:
+                    handler(batch)
+                    continue
+                with self.profiler.Measure("dispatch " + name):
+                    handler(batch)
+
+    def Update(self, task):
+        self.Dispatch()
+        return task.cont
+
+    def Stats(self) -> dict:
+        return {"dispatched": dict(self.dispatched), "dropped": self.dropped}
@@ -1,30 +1,47 @@
-from direct.showbase.ShowBase import ShowBase
-import math, sys, random
+import numpy as np
 from panda3d.core import Vec3  # Import necessary Panda3D classes like Vec3
 
+rng = np.random.default_rng()
+
+def Seed(seed):
+    global rng
+    rng = np.random.default_rng(seed)
+
+def CloudBatch(n, radius=1, generator=None):
+    # Normalized Gaussian samples are uniform on the sphere, unlike normalized points from a cube.
+    generator = generator if generator is not None else rng
+    points = generator.standard_normal((n, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return (points * radius).astype(np.float32)
+
 def Cloud(radius=1):
-    x = 2 * random.random() - 1
-    y = 2 * random.random() - 1
-    z = 2 * random.random() - 1
+    x, y, z = CloudBatch(1, radius)[0]
+    return Vec3(float(x), float(y), float(z))
 
-    unitVec = Vec3(x, y, z)
-    unitVec.normalize()
-    return unitVec * radius
+Cloud.batch = CloudBatch
 
-def BaseballSeams(step, numSeams, B, F=1): 
-    time = step / float(numSeams) * 2 * math.pi
-    F4 = 0  
+def BaseballSeamsBatch(steps, numSeams, B, F=1):
+    time = np.asarray(steps, dtype=np.float64) / np.asarray(numSeams, dtype=np.float64) * 2 * np.pi
+    F4 = 0
     R = 1
-    
-    # 
-    xxx = math.cos(time) - B * math.cos(3 * time)
-    yyy = math.sin(time) + B * math.sin(3 * time)
-    zzz = F * math.cos(2 * time) + F4 * math.cos(4 * time)
-    
-    rrr = math.sqrt(xxx ** 2 + yyy ** 2 + zzz ** 2)
-    
-    x = R * xxx / rrr
-    y = R * yyy / rrr
-    z = R * zzz / rrr
-    
-    return Vec3(x, y, z)
+
+    points = np.stack((np.cos(time) - B * np.cos(3 * time),
+                       np.sin(time) + B * np.sin(3 * time),
+                       F * np.cos(2 * time) + F4 * np.cos(4 * time)), axis=-1)
+    points *= R / np.linalg.norm(points, axis=-1, keepdims=True)
+    return points.astype(np.float32)
+
+def BaseballSeams(step, numSeams, B, F=1): 
+    x, y, z = BaseballSeamsBatch(step, numSeams, B, F)
+    return Vec3(float(x), float(y), float(z))
+
+BaseballSeams.batch = BaseballSeamsBatch
+
+def CircleBatch(n, axis='x', radius=1, generator=None, ring=None):
+    # Steps around the circle along the chosen axis, with the other two coordinates jittered by up to half a unit.
+    # ring, if given, is a baked unit circle of n steps to read the cosines from.
+    generator = generator if generator is not None else rng
+    points = generator.uniform(-0.5, 0.5, (n, 3))
+    cosines = ring[:n, 0] if ring is not None else np.cos(np.arange(n) * 2 * np.pi / n)
+    points[:, {'x': 0, 'y': 1}.get(axis, 2)] = cosines * radius
+    return points.astype(np.float32)
@@ -0,0 +1,330 @@
+from panda3d.core import Loader, NodePath, Vec3, Texture, GeomEnums, Shader
+from panda3d.core import OmniBoundingVolume, ConfigVariableBool, ConfigVariableString, ConfigVariableInt
+import numpy as np
+from CollideObjectBase import PlacedObject
+from Broadphase import Broadphase
+from EntityStore import EntityStore, FLAG_ALIVE
+
+swarmEnabled = ConfigVariableBool('drone-swarm', True)
+swarmMode = ConfigVariableString('drone-swarm-mode', 'auto')  # auto, instanced or batched
+swarmBatchSize = ConfigVariableInt('drone-swarm-batch-size', 64)
+
+INSTANCE_VERTEX_SHADER = """
+#version 140
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform samplerBuffer instanceData;
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+out vec2 texcoord;
+
+void main() {
+    // Each texel holds one drone: xyz position and a uniform scale in w.
+    vec4 xform = texelFetch(instanceData, gl_InstanceID);
+    gl_Position = p3d_ModelViewProjectionMatrix * vec4(p3d_Vertex.xyz * xform.w + xform.xyz, 1.0);
+    texcoord = p3d_MultiTexCoord0;
+}
+"""
+
+INSTANCE_FRAGMENT_SHADER = """
+#version 140
+uniform sampler2D p3d_Texture0;
+in vec2 texcoord;
+out vec4 p3d_FragColor;
+
+void main() {
+    p3d_FragColor = texture(p3d_Texture0, texcoord);
+}
+"""
+
+
+class SwarmDrone:
+    """A swarm drone's whole Python-side state: its transform, velocity, health and flags are a row of the
+    owning DroneSwarm. It is its own modelNode, and has no scene-graph node or collisionNode of its own."""
+    __slots__ = ('swarm', 'name', 'row')
+    category = "drone"
+    collisionNode = None
+
+    def __init__(self, swarm, name: str, row: int):
+        self.swarm = swarm
+        self.name = name
+        self.row = row
+
+    @property
+    def modelNode(self):
+        return self
+
+    @property
+    def health(self) -> float:
+        return float(self.swarm.health[self.row])
+
+    @health.setter
+    def health(self, value: float):
+        self.swarm.health[self.row] = value
+
+    def isEmpty(self):
+        return self.row < 0
+
+    def getName(self):
+        return self.name
+
+    def setName(self, name: str):
+        self.swarm.Rename(self, name)
+
+    def getPos(self, other=None):
+        x, y, z = self.swarm.transforms[self.row, :3]
+        return Vec3(float(x), float(y), float(z))
+
+    def setPos(self, *args):
+        self.swarm.SetPos(self.row, Vec3(*args))
+
+    def getX(self):
+        return float(self.swarm.transforms[self.row, 0])
+
+    def getY(self):
+        return float(self.swarm.transforms[self.row, 1])
+
+    def getZ(self):
+        return float(self.swarm.transforms[self.row, 2])
+
+    def getScale(self):
+        s = float(self.swarm.transforms[self.row, 3])
+        return Vec3(s, s, s)
+
+    def setScale(self, scale):
+        if not isinstance(scale, (int, float)):
+            scale = scale[0]
+        self.swarm.SetScale(self.row, scale)
+
+    def reparentTo(self, parentNode):
+        # Every drone shares the swarm's root, so reparenting only brings a detached drone back.
+        if self.row < 0:
+            self.swarm.Attach(self)
+
+    def detachNode(self):
+        if self.row >= 0:
+            self.swarm.Detach(self)
+
+    def removeNode(self):
+        self.swarm.Release(self)
+
+
+class DroneSwarm(EntityStore):
+    """Renders every drone from one shared geometry with per-instance transforms in a packed array."""
+
+    def __init__(self, loader: Loader, parentNode: NodePath, win, modelPath: str, texPath: str, taskMgr,
+                 colRadius: float = 5, capacity: int = 256, broadphase: Broadphase = None):
+        self.modelPath = modelPath
+        self.texPath = texPath
+        self.colRadius = colRadius
+        self.taskMgr = taskMgr
+
+        self.template: NodePath = PlacedObject.LoadModel(loader, modelPath, copy=True)
+        self.template.flattenStrong()
+        self.texture = PlacedObject.LoadTexture(loader, texPath)
+        self.template.setTexture(self.texture, 1)
+
+        self.root = parentNode.attachNewNode('DroneSwarm')
+        # transforms rows are xyz position and uniform scale, uploaded as-is for the instancing shader.
+        super().__init__({"transforms": (np.float32, 4), "velocity": (np.float32, 3), "health": (np.float32, 1),
+                          "flags": (np.uint8, 1)}, capacity)
+        self.names = {}
+        self.detached = {}
+
+        # Drone collision spheres live in the broadphase grid rather than under the swarm's geometry.
+        self.broadphase = broadphase if broadphase is not None else Broadphase(self.root)
+
+        self.mode = self.ChooseMode(win)
+        if self.mode == 'instanced':
+            self.SetupInstancing()
+        else:
+            self.batches = []
+            self.dirtyBatches = set()
+        self.dirty = False
+
+        self.taskMgr.add(self.Upload, 'DroneSwarm-upload', sort=49)
+
+    @staticmethod
+    def ChooseMode(win):
+        mode = swarmMode.getValue()
+        if mode != 'auto':
+            return mode
+
+        gsg = win.getGsg() if win is not None else None
+        if gsg is not None and gsg.getSupportsBasicShaders() and gsg.getSupportsBufferTexture() \
+                and gsg.getSupportsGeometryInstancing():
+            return 'instanced'
+
+        return 'batched'
+
+    def SetupInstancing(self):
+        self.instanceNode = self.template.copyTo(self.root)
+        self.instanceNode.setShader(Shader.make(Shader.SL_GLSL, INSTANCE_VERTEX_SHADER, INSTANCE_FRAGMENT_SHADER))
+        self.instanceTexture = Texture('DroneSwarm-instances')
+        self.AllocateInstanceTexture()
+        self.instanceNode.setShaderInput('instanceData', self.instanceTexture)
+
+        # Instances are placed by the shader, so the node's own bounds say nothing about where they are.
+        self.instanceNode.node().setBounds(OmniBoundingVolume())
+        self.instanceNode.node().setFinal(True)
+        self.instanceNode.hide()
+
+    def AllocateInstanceTexture(self):
+        self.instanceTexture.setupBufferTexture(len(self.transforms), Texture.T_float, Texture.F_rgba32,
+                                                GeomEnums.UH_dynamic)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name) -> SwarmDrone:
+        return self.names[name]
+
+    def Spawn(self, name: str, posVec, scale: float) -> SwarmDrone:
+        if name in self.names:
+            self.Release(self.names[name])
+
+        handle = SwarmDrone(self, name, -1)
+        self.names[name] = handle
+        self.AddRow(handle, Vec3(*posVec), float(scale))
+        return handle
+
+    def SpawnMany(self, names, positions, scales) -> list:
+        """Adds one drone per name from an (N, 3) array of positions and N scales, writing the rows in one slice."""
+        for name in names:
+            if name in self.names:
+                self.Release(self.names[name])
+
+        handles = [SwarmDrone(self, name, -1) for name in names]
+        rows = self.AddEntities(handles)
+        self.transforms[rows, :3] = positions
+        self.transforms[rows, 3] = scales
+        self.velocity[rows] = 0
+        self.health[rows] = 1
+        self.flags[rows] = FLAG_ALIVE
+
+        for handle, (x, y, z, scale) in zip(handles, self.transforms[rows].tolist()):
+            self.names[handle.name] = handle
+            self.broadphase.AddDynamic(handle.name, "drone", (x, y, z), self.colRadius * scale)
+        self.MarkDirtyRange(rows.start, rows.stop)
+        return handles
+
+    def AddRow(self, handle: SwarmDrone, posVec: Vec3, scale: float):
+        row = self.AddEntity(handle)
+        self.transforms[row] = (posVec.x, posVec.y, posVec.z, scale)
+        self.velocity[row] = 0
+        self.health[row] = 1
+        self.flags[row] = FLAG_ALIVE
+        self.broadphase.AddDynamic(handle.name, "drone", posVec, self.colRadius * scale)
+        self.MarkDirty(row)
+
+    def RemoveRow(self, handle: SwarmDrone):
+        self.broadphase.Remove(handle.name)
+        moved = self.RemoveEntity(handle)
+        if moved >= 0:
+            self.MarkDirty(moved)
+        self.MarkDirty(self.count)
+
+    def Grow(self):
+        super().Grow()
+        if self.mode == 'instanced':
+            self.AllocateInstanceTexture()
+
+    def Attach(self, handle: SwarmDrone):
+        posVec, scale = self.detached.pop(handle.name)
+        self.AddRow(handle, posVec, scale)
+
+    def Detach(self, handle: SwarmDrone):
+        self.detached[handle.name] = (handle.getPos(), float(self.transforms[handle.row, 3]))
+        self.RemoveRow(handle)
+
+    def Release(self, handle: SwarmDrone):
+        if handle.row >= 0:
+            self.RemoveRow(handle)
+        self.detached.pop(handle.name, None)
+        if self.names.get(handle.name) is handle:
+            del self.names[handle.name]
+
+    def Rename(self, handle: SwarmDrone, name: str):
+        del self.names[handle.name]
+        if handle.name in self.detached:
+            self.detached[name] = self.detached.pop(handle.name)
+        if handle.row >= 0:
+            self.broadphase.Remove(handle.name)
+            self.broadphase.AddDynamic(name, "drone", handle.getPos(), self.colRadius * self.transforms[handle.row, 3])
+        handle.name = name
+        self.names[name] = handle
+
+    def SetPos(self, row: int, posVec: Vec3):
+        self.transforms[row, :3] = (posVec.x, posVec.y, posVec.z)
+        self.broadphase.Move(self.handles[row].name, posVec)
+        self.MarkDirty(row)
+
+    def SetScale(self, row: int, scale: float):
+        self.transforms[row, 3] = scale
+        self.broadphase.Resize(self.handles[row].name, self.colRadius * scale)
+        self.MarkDirty(row)
+
+    def SetPositions(self, rows, positions):
+        """Moves many drones at once from an (N, 3) array of positions."""
+        rows = np.asarray(rows)
+        self.transforms[rows, :3] = positions
+        for row, center in zip(rows.tolist(), np.asarray(positions, dtype=np.float32).tolist()):
+            self.broadphase.Move(self.handles[row].name, center)
+            self.MarkDirty(row)
+
+    def FindByCollision(self, entry):
+        """Returns the drone whose collision sphere was hit, or None."""
+        return self.names.get(self.broadphase.Find(entry))
+
+    def MarkDirty(self, row: int):
+        self.dirty = True
+        if self.mode != 'instanced':
+            self.dirtyBatches.add(row // swarmBatchSize.getValue())
+
+    def MarkDirtyRange(self, start: int, stop: int):
+        if start >= stop:
+            return
+        self.dirty = True
+        if self.mode != 'instanced':
+            batchSize = swarmBatchSize.getValue()
+            self.dirtyBatches.update(range(start // batchSize, (stop - 1) // batchSize + 1))
+
+    def Upload(self, task):
+        if not self.dirty:
+            return task.cont
+
+        if self.mode == 'instanced':
+            self.UploadInstances()
+        else:
+            self.RebuildBatches()
+
+        self.dirty = False
+        return task.cont
+
+    def UploadInstances(self):
+        memoryview(self.instanceTexture.modifyRamImage())[:] = self.transforms.tobytes()
+        self.instanceNode.setInstanceCount(self.count)
+        if self.count > 0:
+            self.instanceNode.show()
+        else:
+            self.instanceNode.hide()
+
+    def RebuildBatches(self):
+        # Without instancing, drones are baked into fixed-size batches that are flattened into a few Geoms each.
+        batchSize = swarmBatchSize.getValue()
+        numBatches = (self.count + batchSize - 1) // batchSize
+        while len(self.batches) < numBatches:
+            self.batches.append(self.root.attachNewNode('DroneSwarm-batch-' + str(len(self.batches))))
+
+        for index in sorted(self.dirtyBatches):
+            if index >= len(self.batches):
+                continue
+
+            batch = self.batches[index]
+            batch.getChildren().detach()
+            for x, y, z, scale in self.transforms[index * batchSize:min(self.count, (index + 1) * batchSize)].tolist():
+                copy = self.template.copyTo(batch)
+                copy.setPos(x, y, z)
+                copy.setScale(scale)
+            batch.flattenStrong()
+
+        self.dirtyBatches.clear()
@@ -0,0 +1,74 @@
+import numpy as np
+
+# Bits of the flags column.
+FLAG_ALIVE = 1 << 0
+FLAG_HIT = 1 << 1
+FLAG_BODY = 1 << 2  # has a collision body in the broadphase
+
+
+class EntityStore:
+    """Keeps per-entity state in contiguous typed columns, one row per live entity, with a small handle object
+    for each row. Rows stay packed: removing one moves the last row into the hole and tells its handle.
+
+    columns maps a name to (dtype, width), and each column is an attribute of the store, e.g. store.position."""
+
+    def __init__(self, columns: dict, capacity: int = 64, rowName: str = "row"):
+        self.columnSpecs = dict(columns)
+        self.rowName = rowName  # the handle attribute holding its row, -1 once removed
+        self.capacity = capacity
+        self.count = 0
+        self.handles = []
+        for name, (dtype, width) in self.columnSpecs.items():
+            setattr(self, name, np.zeros((capacity, width) if width > 1 else capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.count
+
+    def AddEntity(self, handle) -> int:
+        if self.count == self.capacity:
+            self.Grow()
+
+        row = self.count
+        self.count += 1
+        self.handles.append(handle)
+        setattr(handle, self.rowName, row)
+        return row
+
+    def AddEntities(self, handles) -> slice:
+        """Appends many handles at once and returns the slice of rows they were given."""
+        first = self.count
+        while first + len(handles) > self.capacity:
+            self.Grow()
+
+        for row, handle in enumerate(handles, first):
+            setattr(handle, self.rowName, row)
+        self.handles.extend(handles)
+        self.count += len(handles)
+        return slice(first, self.count)
+
+    def RemoveEntity(self, handle) -> int:
+        """Returns the row the last entity was moved into, or -1 if the removed row was already the last."""
+        row = getattr(handle, self.rowName)
+        last = self.count - 1
+        moved = -1
+        if row != last:
+            for name in self.columnSpecs:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.handles[row] = self.handles[last]
+            setattr(self.handles[row], self.rowName, row)
+            moved = row
+
+        self.handles.pop()
+        self.count = last
+        setattr(handle, self.rowName, -1)
+        return moved
+
+    def Grow(self):
+        for name in self.columnSpecs:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column, np.zeros_like(column))))
+        self.capacity *= 2
+
+    def ColumnBytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.columnSpecs)
@@ -0,0 +1,43 @@
+from panda3d.core import ClockObject, ConfigVariableDouble, ConfigVariableInt
+
+eventLogRate = ConfigVariableDouble('event-log-rate', 2)  # messages per second for each kind of event
+eventLogBurst = ConfigVariableInt('event-log-burst', 5)
+
+
+class EventLog:
+    """Prints game events, letting each kind through at most rate times a second after an initial burst.
+    Messages over the limit are only counted, and the count is appended to the next one that gets through."""
+
+    def __init__(self, rate: float = None, burst: int = None, write=print):
+        self.rate = rate if rate is not None else eventLogRate.getValue()
+        self.burst = burst if burst is not None else eventLogBurst.getValue()
+        self.write = write
+        self.buckets = {}  # kind -> [tokens, time last refilled]
+        self.suppressed = {}
+        self.counts = {}
+
+    def Log(self, kind: str, message: str, *args) -> bool:
+        """Formats message % args only if it is going to be printed."""
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+        now = ClockObject.getGlobalClock().getFrameTime()
+        bucket = self.buckets.get(kind)
+        if bucket is None:
+            bucket = self.buckets[kind] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            self.suppressed[kind] = self.suppressed.get(kind, 0) + 1
+            return False
+
+        bucket[0] -= 1
+        text = message % args if args else message
+        skipped = self.suppressed.pop(kind, 0)
+        self.write(text if not skipped else f"{text} (+{skipped} more {kind})")
+        return True
+
+    def Stats(self) -> dict:
+        return {"counts": dict(self.counts), "suppressed": dict(self.suppressed)}
+
+
+eventLog = EventLog()
@@ -0,0 +1,181 @@
+from panda3d.core import NodePath, Geom, GeomNode, GeomPoints, GeomVertexArrayFormat, GeomVertexData, GeomVertexFormat
+from panda3d.core import OmniBoundingVolume, TransparencyAttrib, ClockObject
+from panda3d.core import ConfigVariableString, ConfigVariableInt, ConfigVariableDouble
+import re
+import numpy as np
+import DefensePaths as defensePaths
+
+explosionEffect = ConfigVariableString('explosion-effect', 'Assets/Part-Efx/basic_xpld_efx.ptf')
+explosionMaxParticles = ConfigVariableInt('explosion-max-particles', 8192)  # live particles across all explosions
+explosionBurstParticles = ConfigVariableInt('explosion-burst-particles', 256)  # most particles one explosion releases
+explosionSize = ConfigVariableDouble('explosion-size', 4)  # blast radius as a multiple of the destroyed object's
+
+# A .ptf file is Python that configures a ParticleEffect; only the calls on its first particle system are read.
+SETTING = re.compile(r"^p0\.(?:\w+\.)?set(\w+)\((.*)\)\s*$", re.MULTILINE)
+NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d*)?")
+
+
+def ReadEffect(path: str) -> dict:
+    """Reads what the batched renderer uses from a particle effect file: how many particles a burst releases,
+    how long they live, how fast and from how far out they start, and their colors and point size."""
+    with open(path) as effectFile:
+        settings = dict(SETTING.findall(effectFile.read()))
+
+    def Numbers(name, default):
+        values = [float(value) for value in NUMBER.findall(settings.get(name, ""))]
+        return values if values else default
+
+    startColor = Numbers("StartColor", Numbers("Color", [1, 1, 1, 1]))
+    return {
+        "litter": int(Numbers("LitterSize", [1])[0]),
+        "lifespan": Numbers("LifespanBase", [1])[0],
+        "lifespanSpread": Numbers("LifespanSpread", [0])[0],
+        "amplitude": Numbers("Amplitude", [1])[0],
+        "amplitudeSpread": Numbers("AmplitudeSpread", [0])[0],
+        "radius": Numbers("Radius", [0])[0],
+        "startColor": startColor,
+        "endColor": Numbers("EndColor", startColor),
+        "pointSize": Numbers("PointSize", [1])[0],
+        "fade": "PRALPHANONE" not in settings.get("AlphaMode", ""),
+    }
+
+
+class ExplosionSystem:
+    """Runs the particles of every explosion from one fixed-size pool of rows, drawn as a single point cloud
+    whose vertex data is rewritten in bulk once per frame. Bursts that would pass the particle cap are trimmed,
+    and dead particles are compacted away so the pool recycles itself."""
+
+    def __init__(self, parentNode: NodePath, taskMgr=None, effectPath: str = None, maxParticles: int = None,
+                 simulation=None, taskName: str = "explosions", generator=None):
+        self.effect = ReadEffect(effectPath if effectPath is not None else explosionEffect.getValue())
+        self.capacity = maxParticles if maxParticles is not None else explosionMaxParticles.getValue()
+        self.count = 0
+        self.position = np.zeros((self.capacity, 3), dtype=np.float32)
+        self.velocity = np.zeros((self.capacity, 3), dtype=np.float32)
+        self.age = np.zeros(self.capacity, dtype=np.float32)
+        self.lifespan = np.ones(self.capacity, dtype=np.float32)
+        self.vertices = np.zeros((self.capacity, 7), dtype=np.float32)  # xyz and rgba, as the vertex data holds them
+        self.drawn = 0
+        # Particle jitter has a generator of its own, so kills never shift the shared seeded one.
+        self.rng = generator if generator is not None else np.random.default_rng()
+
+        self.bursts = 0
+        self.spawned = 0
+        self.dropped = 0
+
+        self.node = self.MakeNode(parentNode)
+
+        if simulation is not None:
+            simulation.Add(taskName, self.Step, render=self.Render)
+        else:
+            taskMgr.add(self.Update, taskName)
+
+    def MakeNode(self, parentNode: NodePath) -> NodePath:
+        arrayFormat = GeomVertexArrayFormat()
+        arrayFormat.addColumn("vertex", 3, Geom.NT_float32, Geom.C_point)
+        arrayFormat.addColumn("color", 4, Geom.NT_float32, Geom.C_color)
+        vertexData = GeomVertexData("explosions", GeomVertexFormat.registerFormat(arrayFormat), Geom.UH_dynamic)
+        vertexData.uncleanSetNumRows(self.capacity)
+
+        self.geom = Geom(vertexData)
+        self.geom.addPrimitive(GeomPoints(Geom.UH_dynamic))
+        geomNode = GeomNode("explosions")
+        geomNode.addGeom(self.geom)
+        # Particles fly wherever the explosions are, so the node's own bounds say nothing about them.
+        geomNode.setBounds(OmniBoundingVolume())
+        geomNode.setFinal(True)
+
+        node = parentNode.attachNewNode(geomNode)
+        node.setRenderModeThickness(max(2.0, self.effect["pointSize"]))
+        node.setTransparency(TransparencyAttrib.MAlpha)
+        node.setDepthWrite(False)
+        node.setLightOff()
+        node.hide()
+        return node
+
+    def __len__(self):
+        return self.count
+
+    def Explode(self, position, radius: float = 1):
+        self.ExplodeMany([tuple(position)], [radius])
+
+    def ExplodeMany(self, positions, radii):
+        """Starts one explosion at each of the (N, 3) positions, sized to the radius of what blew up there."""
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        if not len(positions):
+            return
+        effect = self.effect
+        wanted = min(effect["litter"], explosionBurstParticles.getValue())
+        perBurst = min(wanted, (self.capacity - self.count) // len(positions))
+        self.bursts += len(positions)
+        self.dropped += (wanted - perBurst) * len(positions)
+        if perBurst <= 0:
+            return
+
+        n = perBurst * len(positions)
+        rows = slice(self.count, self.count + n)
+        scales = np.repeat(np.broadcast_to(np.asarray(radii, dtype=np.float32), len(positions)),
+                           perBurst) * explosionSize.getValue()
+        directions = defensePaths.CloudBatch(n, generator=self.rng)
+        spread = self.rng.uniform(-1, 1, (2, n)).astype(np.float32)
+
+        # Particles start inside the emitter sphere and radiate outwards from the center.
+        depth = np.cbrt(self.rng.random(n, dtype=np.float32)) * effect["radius"]
+        self.position[rows] = np.repeat(positions, perBurst, axis=0) + directions * (depth * scales)[:, None]
+        speeds = (effect["amplitude"] + effect["amplitudeSpread"] * spread[0]) * scales
+        self.velocity[rows] = directions * speeds[:, None]
+        self.age[rows] = 0
+        self.lifespan[rows] = np.maximum(effect["lifespan"] + effect["lifespanSpread"] * spread[1], 0.05)
+
+        self.count += n
+        self.spawned += n
+
+    def Step(self, dt: float):
+        n = self.count
+        if n == 0:
+            return
+
+        self.age[:n] += dt
+        self.position[:n] += self.velocity[:n] * dt
+        alive = self.age[:n] < self.lifespan[:n]
+        if alive.all():
+            return
+
+        keep = np.flatnonzero(alive)
+        for column in (self.position, self.velocity, self.age, self.lifespan):
+            column[:len(keep)] = column[keep]
+        self.count = len(keep)
+
+    def Render(self, alpha: float = 1.0):
+        n = self.count
+        if n == 0 and self.drawn == 0:
+            return
+
+        effect = self.effect
+        life = (self.age[:n] / self.lifespan[:n])[:, None]
+        startColor = np.asarray(effect["startColor"], dtype=np.float32)
+        endColor = np.asarray(effect["endColor"], dtype=np.float32)
+        self.vertices[:n, :3] = self.position[:n]
+        self.vertices[:n, 3:] = startColor + (endColor - startColor) * life
+        if effect["fade"]:
+            self.vertices[:n, 6] *= 1 - life[:, 0]
+
+        memoryview(self.geom.modifyVertexData().modifyArray(0)).cast('B')[:self.vertices[:n].nbytes] = \
+            self.vertices[:n].tobytes()
+        points = self.geom.modifyPrimitive(0)
+        points.clearVertices()
+        if n:
+            points.addConsecutiveVertices(0, n)
+            self.node.show()
+        else:
+            self.node.hide()
+        self.drawn = n
+
+    def Update(self, task):
+        # Without a Simulation, advance once per rendered frame.
+        self.Step(ClockObject.getGlobalClock().getDt())
+        self.Render()
+        return task.cont
+
+    def Stats(self) -> dict:
+        return {"live": self.count, "bursts": self.bursts, "spawned": self.spawned, "dropped": self.dropped}
@@ -0,0 +1,124 @@
+from panda3d.core import NodePath, Quat, Vec3, ClockObject
+
+THRUST = 1 << 0
+YAW_LEFT = 1 << 1
+YAW_RIGHT = 1 << 2
+PITCH_UP = 1 << 3
+PITCH_DOWN = 1 << 4
+ROLL_LEFT = 1 << 5
+ROLL_RIGHT = 1 << 6
+ZOOM_IN = 1 << 7
+ZOOM_OUT = 1 << 8
+
+KEY_BINDINGS = {
+    'w': THRUST,
+    'a': YAW_LEFT,
+    'd': YAW_RIGHT,
+    's': PITCH_DOWN,
+    'q': ROLL_LEFT,
+    'e': ROLL_RIGHT,
+    'x': ZOOM_IN,
+    'z': ZOOM_OUT,
+}
+
+
+class FlightController:
+    """Flies a ship from one task: held keys are bits in a mask, and motion is scaled by the frame time.
+
+    Under a Simulation the ship's state is kept here rather than read back from its node, which only ever shows
+    the state alpha of the way between the last two ticks, camera zoom included."""
+
+    def __init__(self, modelNode: NodePath, camera: NodePath, taskMgr, thrustSpeed: float = 300,
+                 turnRate: float = 90, rollRate: float = 120, zoomSpeed: float = 600, simulation=None):
+        self.modelNode = modelNode
+        self.camera = camera
+        self.thrustSpeed = thrustSpeed
+        self.turnRate = turnRate  # degrees per second for yaw and pitch
+        self.rollRate = rollRate
+        self.zoomSpeed = zoomSpeed
+        self.keys = 0
+
+        if camera is not None:  # window-type none has no camera
+            camera.reparentTo(modelNode)
+            camera.setFluidPos(0, 1, 0)
+
+        # (position, quat, camera distance) after the last tick and the one before; drawn is what Render showed.
+        self.current = self.previous = self.drawn = self.Read()
+
+        if simulation is not None:
+            simulation.Add('flight-control', self.Step, render=self.Render)
+        else:
+            taskMgr.add(self.Update, 'flight-control')
+
+    def Bind(self, accept, bindings: dict = KEY_BINDINGS):
+        for key, bit in bindings.items():
+            accept(key, self.SetKey, [bit, True])
+            accept(key + '-up', self.SetKey, [bit, False])
+
+    def SetKey(self, bit: int, down: bool):
+        if down:
+            self.keys |= bit
+        else:
+            self.keys &= ~bit
+
+    def Axis(self, positive: int, negative: int) -> int:
+        return bool(self.keys & positive) - bool(self.keys & negative)
+
+    def Update(self, task):
+        # task.dt is how long this task itself last ran; motion needs the frame time step.
+        self.Step(ClockObject.getGlobalClock().getDt())
+        return task.cont
+
+    def Read(self) -> tuple:
+        return (self.modelNode.getPos(), self.modelNode.getQuat(),
+                self.camera.getY() if self.camera is not None else 0.0)
+
+    def Place(self, state: tuple):
+        position, quat, cameraY = state
+        self.modelNode.setPosQuat(position, quat)
+        if self.camera is not None:
+            self.camera.setY(cameraY)
+        self.drawn = state
+
+    def Step(self, dt: float):
+        # Whatever moved the ship since it was drawn, such as the collision pusher, moved its state as well.
+        position, quat, cameraY = self.current
+        position = position + (self.modelNode.getPos() - self.drawn[0])
+        self.current = self.previous = (position, quat, cameraY)
+        self.Place(self.current)
+
+        keys = self.keys
+        if not keys:
+            return
+
+        yaw = self.Axis(YAW_LEFT, YAW_RIGHT) * self.turnRate * dt
+        pitch = self.Axis(PITCH_UP, PITCH_DOWN) * -self.turnRate * dt
+        roll = self.Axis(ROLL_LEFT, ROLL_RIGHT) * self.rollRate * dt
+        quat = self.modelNode.getQuat()
+        if yaw or pitch or roll:
+            # The turn is applied in the ship's own frame, so yaw stays about the ship's up axis after a roll.
+            turn = Quat()
+            turn.setHpr(Vec3(yaw, pitch, roll))
+            quat = turn * quat
+            quat.normalize()
+            self.modelNode.setQuat(quat)
+
+        if keys & THRUST:
+            self.modelNode.setPos(self.modelNode.getPos() + quat.getForward() * self.thrustSpeed * dt)
+
+        zoom = self.Axis(ZOOM_IN, ZOOM_OUT)
+        if zoom and self.camera is not None:
+            self.camera.setY(self.camera.getY() + zoom * self.zoomSpeed * dt)
+        self.current = self.drawn = self.Read()
+
+    def Render(self, alpha: float):
+        """Shows the ship alpha of the way from its state at the previous tick to the last one."""
+        if self.current is self.previous:
+            return
+        (fromPos, fromQuat, fromY), (toPos, toQuat, toY) = self.previous, self.current
+        if fromQuat.dot(toQuat) < 0:
+            # q and -q are the same turn; blend towards the nearer one so the ship never swings the long way.
+            toQuat = -toQuat
+        quat = Quat(fromQuat + (toQuat - fromQuat) * alpha)
+        quat.normalize()
+        self.Place((fromPos + (toPos - fromPos) * alpha, quat, fromY + (toY - fromY) * alpha))
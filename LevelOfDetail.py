@@ -0,0 +1,152 @@
+from panda3d.core import NodePath, LODNode, Geom, GeomTriangles, GeomVertexData, GeomVertexReader
+from panda3d.core import GeomVertexWriter, CollisionNode, SamplerState, Texture, TextureStage, Thread
+from panda3d.core import ConfigVariableBool
+import numpy as np
+
+lodEnabled = ConfigVariableBool('scene-lod', True)
+
+# (far edge in bounding radii, cluster cell as a fraction of the radius, minimum mip level sampled)
+PLANET_LEVELS = ((12, 0, 0), (30, 0.2, 2), (1e6, 0.35, 4))
+STATION_LEVELS = ((8, 0, 0), (20, 0.1, 1), (1e6, 0.2, 3))
+
+reducedGeometry = {}  # (template key, cell fraction) -> NodePath shared by every model built on the template
+
+
+def ClusterGeom(geom: Geom, cellSize: float, uvCell: float = 1 / 8) -> Geom:
+    """Vertex-clustering simplification: vertices sharing a position cell and a texcoord cell are merged into
+    one at their mean position, and triangles that collapse are dropped. The texcoord term keeps UV seams."""
+    vertexData = geom.getVertexData()
+    rows = vertexData.getNumRows()
+    positions = np.zeros((rows, 3), dtype=np.float64)
+    texcoords = np.zeros((rows, 2), dtype=np.float64)
+    vertexReader = GeomVertexReader(vertexData, 'vertex')
+    hasTexcoord = vertexData.hasColumn('texcoord')
+    texReader = GeomVertexReader(vertexData, 'texcoord') if hasTexcoord else None
+    for row in range(rows):
+        positions[row] = vertexReader.getData3()
+        if hasTexcoord:
+            texcoords[row] = texReader.getData2()
+
+    keys = np.concatenate((np.floor(positions / cellSize), np.floor(texcoords / uvCell)), axis=1)
+    _, cluster, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.reshape(-1)
+    means = np.zeros((len(counts), 3))
+    np.add.at(means, cluster, positions)
+    means /= counts[:, None]
+
+    # Each cluster keeps its first vertex's normal and texcoord.
+    first = np.full(len(counts), rows, dtype=np.int64)
+    np.minimum.at(first, cluster, np.arange(rows))
+
+    reduced = GeomVertexData(vertexData.getName(), vertexData.getFormat(), Geom.UHStatic)
+    reduced.setNumRows(len(counts))
+    thread = Thread.getCurrentThread()
+    for index, row in enumerate(first.tolist()):
+        reduced.copyRowFrom(index, vertexData, row, thread)
+    writer = GeomVertexWriter(reduced, 'vertex')
+    for x, y, z in means.tolist():
+        writer.setData3(x, y, z)
+
+    triangles = GeomTriangles(Geom.UHStatic)
+    for p in range(geom.getNumPrimitives()):
+        primitive = geom.getPrimitive(p).decompose()
+        vertices = cluster[[primitive.getVertex(i) for i in range(primitive.getNumVertices())]].reshape(-1, 3)
+        keep = (vertices[:, 0] != vertices[:, 1]) & (vertices[:, 1] != vertices[:, 2]) & (vertices[:, 0] != vertices[:, 2])
+        for a, b, c in vertices[keep].tolist():
+            triangles.addVertices(a, b, c)
+
+    result = Geom(reduced)
+    result.addPrimitive(triangles)
+    return result
+
+
+def ReduceModel(modelNode: NodePath, cellFraction: float) -> NodePath:
+    reduced = NodePath(modelNode.node().copySubgraph())
+    cellSize = modelNode.getBounds().getRadius() * cellFraction
+    for geomNodePath in reduced.findAllMatches('**/+GeomNode'):
+        geomNode = geomNodePath.node()
+        for index in range(geomNode.getNumGeoms()):
+            geomNode.setGeom(index, ClusterGeom(geomNode.getGeom(index), cellSize))
+    return reduced
+
+
+def MipLimitedSampler(tex: Texture, minLod: int) -> SamplerState:
+    sampler = SamplerState(tex.getDefaultSampler())
+    sampler.setMinfilter(SamplerState.FT_linear_mipmap_linear)
+    sampler.setMinLod(minLod)
+    return sampler
+
+
+class LODModel:
+    """Puts a model's geometry under an LODNode whose farther levels use clustered meshes and sample only
+    coarser mip levels. Switch distances are in bounding radii, so they scale with the model."""
+
+    deferred = None  # when a list, farther levels show the full mesh until ReduceDeferred gets to them
+
+    def __init__(self, modelNode: NodePath, levels=PLANET_LEVELS):
+        self.modelNode = modelNode
+        self.levels = []
+
+        visuals = [child for child in modelNode.getChildren() if not isinstance(child.node(), CollisionNode)]
+        if not visuals or not levels:
+            return
+
+        # Measured on the geometry alone: the collision solids would inflate the bounds.
+        bounds = visuals[0].getBounds()
+        radius = bounds.getRadius()
+        lodNode = LODNode('lod')
+        lodNode.setCenter(bounds.getCenter())
+        self.lod = modelNode.attachNewNode(lodNode)
+
+        near = 0.0
+        for far, cellFraction, minLod in levels:
+            lodNode.addSwitch(far * radius, near * radius)
+            level = self.lod.attachNewNode('level-%d' % len(self.levels))
+            for visual in visuals:
+                key = (visual.node(), cellFraction)
+                if cellFraction == 0:
+                    visual.instanceTo(level)
+                elif key not in reducedGeometry and LODModel.deferred is not None:
+                    visual.instanceTo(level)
+                    LODModel.deferred.append((level, visual, cellFraction))
+                else:
+                    if key not in reducedGeometry:
+                        reducedGeometry[key] = ReduceModel(visual, cellFraction)
+                    reducedGeometry[key].instanceTo(level)
+            self.levels.append((level, minLod))
+            near = far
+
+        for visual in visuals:
+            visual.detachNode()
+
+    @staticmethod
+    def ReduceDeferred():
+        """Swaps the reduced meshes into every level that was left showing the full one, yielding after each mesh
+        it has to build so the work can be spread over frames. Models built afterwards are reduced right away."""
+        while LODModel.deferred:
+            level, visual, cellFraction = LODModel.deferred.pop(0)
+            key = (visual.node(), cellFraction)
+            built = key not in reducedGeometry
+            if built:
+                reducedGeometry[key] = ReduceModel(visual, cellFraction)
+            for child in level.getChildren():
+                if child.node() == key[0]:
+                    child.detachNode()
+            reducedGeometry[key].instanceTo(level)
+            if built:
+                yield
+        LODModel.deferred = None
+
+    def SetTexture(self, tex: Texture, priority: int = 1):
+        """Applies the texture to every level, each one limited to its own coarsest mips."""
+        if self.modelNode.isEmpty():
+            return
+        if not self.levels:
+            self.modelNode.setTexture(tex, priority)
+            return
+
+        for level, minLod in self.levels:
+            if minLod == 0:
+                level.setTexture(tex, priority)
+            else:
+                level.setTexture(TextureStage.getDefault(), tex, MipLimitedSampler(tex, minLod), priority)
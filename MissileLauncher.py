@@ -0,0 +1,137 @@
+from panda3d.core import Loader, NodePath, Vec3, CollisionTraverser, CollisionHandlerQueue, ConfigVariableInt, ClockObject
+from direct.showbase.MessengerGlobal import messenger
+from SpaceJamClasses import Missile
+from Broadphase import Broadphase
+from ObjectPool import ObjectPool
+from CollideObjectBase import PlacedObject
+from EventLog import eventLog
+from EntityStore import EntityStore
+import numpy as np
+
+missilePoolSize = ConfigVariableInt('missile-pool-size', 8)
+
+
+class MissileLauncher(EntityStore):
+    """Fires missiles from a fixed pool and resolves all of their swept hit tests with one traversal per frame.
+    Missiles in flight are its rows: they are all advanced at once from the position and velocity arrays."""
+
+    def __init__(self, loader: Loader, parentNode: NodePath, taskMgr, broadphase: Broadphase, modelPath: str,
+                 reloadTime: float = 0.25, missileDistance: float = 4000, missileSpeed: float = 2000,
+                 scale: float = 20, poolSize: int = None, simulation=None, dispatcher=None):
+        self.parentNode = parentNode
+        self.broadphase = broadphase
+        self.dispatcher = dispatcher
+        self.reloadTime = reloadTime
+        self.lastFireTime = None
+
+        self.traverser = CollisionTraverser('missile-sweeps')
+        self.queue = CollisionHandlerQueue()
+
+        poolSize = poolSize if poolSize is not None else missilePoolSize.getValue()
+        # previous holds each missile's position before the last tick, which Render interpolates from.
+        super().__init__({"position": (np.float32, 3), "previous": (np.float32, 3), "velocity": (np.float32, 3),
+                          "travelled": (np.float32, 1), "distance": (np.float32, 1)}, max(poolSize, 1),
+                         rowName="flightRow")
+        self.built = 0
+        self.pool = ObjectPool(lambda: self.MakeMissile(loader, modelPath, missileDistance, missileSpeed, scale),
+                               reset=None, prewarm=poolSize, highWater=poolSize, limit=poolSize)
+
+        if simulation is not None:
+            simulation.Add('missile-flight', self.Step, sort=29, render=self.Render)
+        else:
+            taskMgr.add(self.Update, 'missile-flight', sort=29)
+
+    def Fire(self, origin: NodePath, time: float):
+        if self.lastFireTime is not None and time - self.lastFireTime < self.reloadTime:
+            return None
+
+        missile = self.pool.Acquire()
+        if missile is None:
+            eventLog.Log("missile-empty", "No missiles available to fire.")
+            return None
+
+        missile.modelNode.reparentTo(self.parentNode)
+        velocity = missile.Fire(origin)
+        if velocity is None:
+            missile.modelNode.detachNode()
+            self.pool.Release(missile)
+            return None
+
+        self.lastFireTime = time
+        row = self.AddEntity(missile)
+        self.position[row] = self.previous[row] = missile.modelNode.getPos()
+        self.velocity[row] = velocity
+        self.travelled[row] = 0
+        self.distance[row] = missile.missileDistance
+        PlacedObject.Register(missile)
+        self.traverser.addCollider(missile.sweepNode, self.queue)
+        return missile
+
+    def MakeMissile(self, loader, modelPath, missileDistance, missileSpeed, scale) -> Missile:
+        self.built += 1
+        missile = Missile(loader, modelPath, self.parentNode, 'Missile' + str(self.built), Vec3(0, 0, 0), 2, 1,
+                          missileDistance, missileSpeed)
+        missile.modelNode.setScale(scale)
+        return missile
+
+    def Recycle(self, missile: Missile):
+        self.traverser.removeCollider(missile.sweepNode)
+        self.RemoveEntity(missile)
+        self.pool.Release(missile)
+
+    def Update(self, task):
+        # task.dt is how long this task itself last ran; flight needs the frame time step.
+        self.Step(ClockObject.getGlobalClock().getDt())
+        self.Render(1.0)
+        return task.cont
+
+    def Render(self, alpha: float):
+        """Places every missile alpha of the way between its last two simulated positions."""
+        n = self.count
+        positions = self.previous[:n] + (self.position[:n] - self.previous[:n]) * alpha
+        for missile, (x, y, z) in zip(self.handles, positions.tolist()):
+            missile.modelNode.setPos(x, y, z)
+
+    def Advance(self, dt: float) -> list:
+        """Moves every missile velocity * dt, stretching each sweep segment over the step, and returns the
+        missiles that have now flown their full distance."""
+        n = self.count
+        if dt > 0:
+            self.previous[:n] = self.position[:n]
+            self.position[:n] += self.velocity[:n] * dt
+            self.travelled[:n] += np.linalg.norm(self.velocity[:n], axis=1) * dt
+            for missile, (ax, ay, az), (bx, by, bz) in zip(self.handles, self.previous[:n].tolist(),
+                                                              self.position[:n].tolist()):
+                segment = missile.sweepNode.node().modifySolid(0)
+                segment.setPointA(ax, ay, az)
+                segment.setPointB(bx, by, bz)
+
+        spent = np.flatnonzero(self.travelled[:n] >= self.distance[:n])
+        return [self.handles[row] for row in spent.tolist()]
+
+    def Step(self, dt: float):
+        if not self.count:
+            return
+
+        spent = self.Advance(dt)
+
+        self.queue.clearEntries()
+        self.broadphase.Traverse(self.traverser)
+        self.queue.sortEntries()
+
+        # Entries are sorted along each segment, so the first one per missile is what it struck first.
+        firstHits = {}
+        for entry in self.queue.entries:
+            firstHits.setdefault(entry.getFromNodePath().getKey(), entry)
+
+        for missile in list(self.handles):
+            entry = firstHits.get(missile.sweepNode.getKey())
+            if entry is not None:
+                missile.modelNode.setPos(entry.getSurfacePoint(self.parentNode))
+                self.Recycle(missile)
+                if self.dispatcher is not None:
+                    self.dispatcher.Add(entry, missile)
+                else:
+                    messenger.send('missile-hit', [missile, entry])
+            elif missile in spent:
+                self.Recycle(missile)
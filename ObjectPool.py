@@ -0,0 +1,87 @@
+from panda3d.core import NodePath
+from CollideObjectBase import PlacedObject
+
+
+def DetachModel(obj):
+    # The CollisionNode stays parented to the model (or wherever the broadphase put it), so the solid is reused.
+    PlacedObject.Unregister(obj)
+    obj.modelNode.detachNode()
+
+
+def PlaceModel(obj, parentNode: NodePath, nodeName: str = None, posVec=None, scaleVec=None):
+    obj.modelNode.reparentTo(parentNode)
+    if nodeName is not None:
+        obj.modelNode.setName(nodeName)
+    if posVec is not None:
+        obj.modelNode.setPos(posVec)
+    if scaleVec is not None:
+        obj.modelNode.setScale(scaleVec)
+    PlacedObject.Register(obj)
+
+
+def DestroyModel(obj):
+    PlacedObject.Unregister(obj)
+    obj.modelNode.removeNode()
+
+
+class ObjectPool:
+    """Recycles objects from the CollideableObject hierarchy (anything with a modelNode) so steady-state
+    spawning reuses loaded models and collision nodes instead of building new ones."""
+
+    def __init__(self, factory, reset=PlaceModel, release=DetachModel, destroy=DestroyModel,
+                 prewarm: int = 0, highWater: int = None, limit: int = None):
+        self.factory = factory
+        self.resetHook = reset
+        self.releaseHook = release
+        self.destroyHook = destroy
+        self.highWater = highWater  # most idle objects kept; extras are destroyed on release
+        self.limit = limit  # most objects live at once; Acquire returns None past it
+
+        self.free = []
+        self.live = 0
+        self.allocations = 0
+        self.avoided = 0
+        self.discarded = 0
+
+        self.Prewarm(prewarm)
+
+    def Prewarm(self, count: int):
+        while len(self.free) < count:
+            obj = self.factory()
+            self.allocations += 1
+            self.releaseHook(obj)
+            self.free.append(obj)
+
+    def Acquire(self, *args, **kwargs):
+        if self.limit is not None and self.live >= self.limit:
+            return None
+
+        if self.free:
+            obj = self.free.pop()
+            self.avoided += 1
+        else:
+            obj = self.factory()
+            self.allocations += 1
+
+        self.live += 1
+        if self.resetHook is not None:
+            self.resetHook(obj, *args, **kwargs)
+        return obj
+
+    def Release(self, obj):
+        self.live -= 1
+        self.releaseHook(obj)
+        if self.highWater is not None and len(self.free) >= self.highWater:
+            self.destroyHook(obj)
+            self.discarded += 1
+            return
+        self.free.append(obj)
+
+    def Stats(self) -> dict:
+        return {
+            "live": self.live,
+            "free": len(self.free),
+            "allocations": self.allocations,
+            "allocationsAvoided": self.avoided,
+            "discarded": self.discarded,
+        }
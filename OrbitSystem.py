@@ -0,0 +1,151 @@
+from panda3d.core import NodePath, ClockObject
+import numpy as np
+import DefensePaths as defensePaths
+import PathBake as pathBake
+from EntityStore import EntityStore
+
+ORBIT_TYPES = {"MLB": 0, "Cloud": 1, "Circle": 2}
+ORBIT_NAMES = {kind: name for name, kind in ORBIT_TYPES.items()}
+
+
+class OrbitSystem(EntityStore):
+    """Advances every orbiter from one task, keeping orbit parameters in struct-of-arrays storage. Orbits are
+    read from baked path tables rather than evaluated each frame."""
+
+    def __init__(self, taskMgr, velocity: float = 0.005, cloudTimer: int = 240, seamsB: float = 2.0,
+                 capacity: int = 64, taskName: str = "OrbitSystem", simulation=None):
+        self.taskMgr = taskMgr
+        self.velocity = velocity
+        self.cloudTimer = cloudTimer
+        self.seamsB = seamsB
+        self.time = 0.0
+
+        self.seamsTable, self.ringTable, self.cloudTable = [pathBake.Table(kind, **params)
+                                                            for kind, params in pathBake.OrbitSpecs(seamsB)]
+
+        # previous holds positions at the start of the last tick; placed is False until a row's first tick.
+        super().__init__({"kind": (np.int8, 1), "radius": (np.float32, 1), "phase": (np.float64, 1),
+                          "speed": (np.float64, 1), "period": (np.float64, 1), "clock": (np.int32, 1),
+                          "centerIndex": (np.int32, 1), "targetIndex": (np.int32, 1), "positions": (np.float32, 3),
+                          "previous": (np.float32, 3), "placed": (bool, 1)}, capacity, rowName="orbitRow")
+
+        self.anchors = []
+        self.anchorIndex = {}
+
+        if simulation is not None:
+            simulation.Add(taskName, self.Step, render=self.Render)
+        else:
+            self.taskMgr.add(self.Update, taskName)
+
+    def Anchor(self, nodePath: NodePath) -> int:
+        # Centers and stare targets are shared by many orbiters, so each one is only read once per frame.
+        key = nodePath.getKey()
+        if key not in self.anchorIndex:
+            self.anchorIndex[key] = len(self.anchors)
+            self.anchors.append(nodePath)
+        return self.anchorIndex[key]
+
+    def Add(self, owner, orbitType: str, orbitRadius: float, center: NodePath, staringAt: NodePath = None,
+            phase: float = 0, speed: float = 0, period: float = 1) -> int:
+        """phase and speed drive Circle orbits, in radians and radians per second; period stretches the time an
+        MLB orbit takes to go once around the seams."""
+        if orbitType == "MLB" and not period > 0:
+            raise ValueError("MLB orbits need a period greater than 0, not " + repr(period))
+        row = self.AddEntity(owner)
+        self.kind[row] = ORBIT_TYPES[orbitType]
+        self.radius[row] = orbitRadius
+        self.phase[row] = phase
+        self.speed[row] = speed
+        self.period[row] = period
+        self.clock[row] = 0
+        self.centerIndex[row] = self.Anchor(center)
+        self.targetIndex[row] = self.Anchor(staringAt) if staringAt is not None else -1
+        self.positions[row] = self.previous[row] = owner.modelNode.getPos()
+        self.placed[row] = False
+        return row
+
+    def Remove(self, owner):
+        if owner.orbitRow >= 0:
+            self.RemoveEntity(owner)
+
+    def ReadAnchors(self):
+        return np.array([anchor.getPos() for anchor in self.anchors], dtype=np.float32).reshape(-1, 3)
+
+    def Advance(self, time: float, dt: float):
+        n = self.count
+        kind = self.kind[:n]
+        anchors = self.ReadAnchors()
+        centers = anchors[self.centerIndex[:n]]
+
+        mlb = np.flatnonzero(kind == ORBIT_TYPES["MLB"])
+        if len(mlb):
+            # An orbiter goes once around the seams every period / velocity seconds.
+            seams = pathBake.Sample(self.seamsTable, time * self.velocity / self.period[mlb])
+            self.positions[mlb] = seams * self.radius[mlb, None] + centers[mlb]
+
+        cloud = np.flatnonzero(kind == ORBIT_TYPES["Cloud"])
+        if len(cloud):
+            self.clock[cloud] += 1
+            jump = cloud[self.clock[cloud] > self.cloudTimer]
+            if len(jump):
+                self.clock[jump] = 0
+                points = self.cloudTable[defensePaths.rng.integers(len(self.cloudTable), size=len(jump))]
+                self.positions[jump] = points * self.radius[jump, None] + centers[jump]
+                self.previous[jump] = self.positions[jump]  # a jump is drawn as a jump, not interpolated
+
+        circle = np.flatnonzero(kind == ORBIT_TYPES["Circle"])
+        if len(circle):
+            self.phase[circle] += self.speed[circle] * dt
+            ring = pathBake.Sample(self.ringTable, self.phase[circle] / (2 * np.pi))
+            self.positions[circle, 0] = centers[circle, 0] + self.radius[circle] * ring[:, 0]
+            self.positions[circle, 1] = centers[circle, 1] + self.radius[circle] * ring[:, 1]
+            self.positions[circle, 2] = centers[circle, 2]
+
+        return anchors
+
+    def Headings(self, anchors, positions):
+        # Same orientation lookAt would give: +Y forward, +Z up, no roll.
+        n = self.count
+        hpr = np.zeros((n, 3), dtype=np.float32)
+        staring = np.flatnonzero(self.targetIndex[:n] >= 0)
+        if len(staring):
+            delta = anchors[self.targetIndex[staring]] - positions[staring]
+            hpr[staring, 0] = np.degrees(np.arctan2(-delta[:, 0], delta[:, 1]))
+            hpr[staring, 1] = np.degrees(np.arctan2(delta[:, 2], np.hypot(delta[:, 0], delta[:, 1])))
+        return staring, hpr
+
+    def Step(self, dt: float):
+        self.time += dt
+        if self.count == 0:
+            return
+        self.previous[:self.count] = self.positions[:self.count]
+        self.Advance(self.time, dt)
+
+        fresh = np.flatnonzero(~self.placed[:self.count])
+        if len(fresh):
+            self.previous[fresh] = self.positions[fresh]
+            self.placed[fresh] = True
+
+    def Render(self, alpha: float):
+        """Places every owner between its last two simulated positions, alpha of the way along."""
+        if self.count == 0:
+            return
+
+        n = self.count
+        positions = self.previous[:n] + (self.positions[:n] - self.previous[:n]) * alpha
+        staring, hpr = self.Headings(self.ReadAnchors(), positions)
+        isStaring = np.zeros(n, dtype=bool)
+        isStaring[staring] = True
+
+        for owner, (x, y, z), (h, p, r), stare in zip(self.handles, positions.tolist(), hpr.tolist(),
+                                                      isStaring.tolist()):
+            if stare:
+                owner.modelNode.setPosHpr(x, y, z, h, p, r)
+            else:
+                owner.modelNode.setPos(x, y, z)
+
+    def Update(self, task):
+        # Without a Simulation, advance once per rendered frame.
+        self.Step(ClockObject.getGlobalClock().getDt())
+        self.Render(1.0)
+        return task.cont
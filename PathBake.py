@@ -0,0 +1,130 @@
+from panda3d.core import ConfigVariableInt
+import argparse, hashlib, json, os, sys
+import numpy as np
+import DefensePaths as defensePaths
+import AssetBuild
+
+PATH_VERSION = 1
+PATH_DIR = os.path.join(AssetBuild.BUILD_DIR, "paths")
+
+pathTableSamples = ConfigVariableInt('path-table-samples', 4096)  # rows per lap of the orbit tables
+
+tables = {}  # key -> table, memory-mapped when it was read from disk
+
+
+def Key(kind: str, params: dict) -> str:
+    text = json.dumps(dict(params, kind=kind, version=PATH_VERSION), sort_keys=True)
+    return kind + "-" + hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def TablePath(key: str, pathDir: str = PATH_DIR) -> str:
+    return os.path.join(pathDir, key + ".npy").replace('\\', '/')
+
+
+def Compute(kind: str, params: dict) -> np.ndarray:
+    """seams and ring tables are closed loops: samples + 1 rows, the last repeating the first, so any point
+    along them can be interpolated. cloud tables are size points from a seeded generator."""
+    if kind == "seams":
+        samples = params["samples"]
+        return defensePaths.BaseballSeams.batch(np.arange(samples + 1), samples, params["B"], params.get("F", 1))
+    if kind == "ring":
+        angles = np.arange(params["samples"] + 1) * 2 * np.pi / params["samples"]
+        return np.stack((np.cos(angles), np.sin(angles)), axis=-1).astype(np.float32)
+    if kind == "cloud":
+        return defensePaths.Cloud.batch(params["size"], generator=np.random.default_rng(params["seed"]))
+    raise ValueError("unknown path table " + repr(kind))
+
+
+def Save(table: np.ndarray, path: str):
+    # Written under a temporary name first, so a reader never maps a half-written table.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as tableFile:
+        np.save(tableFile, table)
+    os.replace(temporary, path)
+
+
+def BakeOne(kind: str, params: dict, pathDir: str = PATH_DIR, force: bool = False) -> bool:
+    """Runs in a worker process. Returns True if the table was built, False if it was already baked."""
+    path = TablePath(Key(kind, params), pathDir)
+    if not force and os.path.exists(path):
+        return False
+    Save(Compute(kind, params), path)
+    return True
+
+
+def Bake(specs, pathDir: str = PATH_DIR, workers: int = None, force: bool = False) -> dict:
+    """Bakes every (kind, params) in specs across a process pool."""
+    unique = {Key(kind, params): (kind, params) for kind, params in specs}
+    counts = {"built": 0, "cached": 0}
+    if not unique:
+        return counts
+
+    # Imported here: the game reads tables on every start but only bakes them from the command line.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(BakeOne, kind, params, pathDir, force) for kind, params in unique.values()]
+        for future in futures:
+            counts["built" if future.result() else "cached"] += 1
+    return counts
+
+
+def Table(kind: str, pathDir: str = PATH_DIR, **params) -> np.ndarray:
+    """Returns the table for kind and params, memory-mapped read-only from its baked .npy file. A table that
+    was never baked is computed here and saved for the next run."""
+    key = Key(kind, params)
+    table = tables.get(key)
+    if table is not None:
+        return table
+
+    path = TablePath(key, pathDir)
+    try:
+        table = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        table = Compute(kind, params)
+        try:
+            Save(table, path)
+        except OSError:
+            pass  # a read-only install computes its tables every start
+    tables[key] = table
+    return table
+
+
+def Sample(table: np.ndarray, fractions) -> np.ndarray:
+    """Interpolates a closed-loop table at fractions of the way around it; whole laps are ignored."""
+    samples = len(table) - 1
+    position = np.mod(np.asarray(fractions, dtype=np.float64), 1.0) * samples
+    index = np.minimum(position.astype(np.int64), samples - 1)
+    weight = (position - index)[:, None]
+    return table[index] * (1 - weight) + table[index + 1] * weight
+
+
+def OrbitSpecs(seamsB: float = 2.0, samples: int = None) -> list:
+    samples = samples if samples is not None else pathTableSamples.getValue()
+    return [("seams", {"samples": samples, "B": seamsB, "F": 1}),
+            ("ring", {"samples": samples}),
+            ("cloud", {"size": samples, "seed": 0})]
+
+
+def main(argv=None):
+    import SceneFile
+
+    parser = argparse.ArgumentParser(description="Precompute formation and orbit path tables into .npy files.")
+    parser.add_argument("scenes", nargs="*", help="scene files whose formations to bake (default: scene-file)")
+    parser.add_argument("--out", default=PATH_DIR, help="table output directory")
+    parser.add_argument("--seams-B", type=float, nargs="*", default=[2.0], help="seams B values to bake orbits for")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="rebuild tables that are already baked")
+    args = parser.parse_args(argv)
+
+    specs = [spec for seamsB in args.seams_B for spec in OrbitSpecs(seamsB)]
+    for scene in args.scenes or [SceneFile.sceneFile.getValue()]:
+        specs.extend(SceneFile.FormationTables(SceneFile.ReadSource(scene)))
+
+    counts = Bake(specs, args.out, args.workers, args.force)
+    print(f"{counts['built']} built, {counts['cached']} up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+from panda3d.core import NodePath, PythonTask, TextNode, TransparencyAttrib, ClockObject
+from panda3d.core import ConfigVariableBool, ConfigVariableInt, ConfigVariableString
+from direct.showbase.MessengerGlobal import messenger
+from contextlib import contextmanager
+import csv, json, time
+import numpy as np
+
+profilerEnabled = ConfigVariableBool('frame-profiler', False)
+profilerOverlay = ConfigVariableBool('frame-profiler-overlay', True)
+profilerWindow = ConfigVariableInt('frame-profiler-window', 600)
+profilerTrace = ConfigVariableString('frame-profiler-trace', '')
+profilerFrames = ConfigVariableInt('frame-profiler-frames', 0)
+
+
+class TimingStats:
+    """Call count and running totals for one task, plus a ring of recent samples for percentiles."""
+    __slots__ = ('samples', 'calls', 'total', 'worst')
+
+    def __init__(self, window: int):
+        self.samples = np.zeros(window, dtype=np.float64)
+        self.calls = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def Add(self, seconds: float):
+        self.samples[self.calls % len(self.samples)] = seconds
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.worst:
+            self.worst = seconds
+
+    def Summary(self) -> dict:
+        recent = self.samples[:min(self.calls, len(self.samples))]
+        p50, p99 = np.percentile(recent, (50, 99)) if len(recent) else (0.0, 0.0)
+        return {
+            "calls": self.calls,
+            "totalMs": self.total * 1000,
+            "meanMs": self.total * 1000 / self.calls if self.calls else 0.0,
+            "p50Ms": p50 * 1000,
+            "p99Ms": p99 * 1000,
+            "maxMs": self.worst * 1000,
+        }
+
+
+class FrameProfiler:
+    """Times every Python task the task manager runs, plus any section wrapped in Measure, and reports
+    per-name call counts and p50/p99 wall times on screen and to a trace file."""
+
+    def __init__(self, taskMgr, window: int = None, overlayParent: NodePath = None, accept=None,
+                 frameLimit: int = None):
+        self.taskMgr = taskMgr
+        self.window = window if window is not None else profilerWindow.getValue()
+        self.frameLimit = frameLimit if frameLimit is not None else profilerFrames.getValue()
+        self.stats = {}
+        self.wrapped = set()
+        self.frames = 0
+        self.overlay = None
+        self.nextRefresh = 0.0
+
+        self.Instrument(taskMgr)
+        taskMgr.add(self.Update, 'frame-profiler', sort=-100)
+
+        if overlayParent is not None and profilerOverlay.getValue():
+            self.ShowOverlay(overlayParent)
+            if accept is not None:
+                accept('f3', self.ToggleOverlay)
+
+    def Stats(self, name: str) -> TimingStats:
+        if name not in self.stats:
+            self.stats[name] = TimingStats(self.window)
+        return self.stats[name]
+
+    def Instrument(self, taskMgr):
+        for task in taskMgr.getAllTasks():
+            self.WrapTask(task)
+
+        # Tasks added later (drone spawns, key-held movement) are timed too.
+        add = taskMgr.add
+        doMethodLater = taskMgr.doMethodLater
+
+        def addTimed(*args, **kwargs):
+            return self.WrapTask(add(*args, **kwargs))
+
+        def doMethodLaterTimed(*args, **kwargs):
+            return self.WrapTask(doMethodLater(*args, **kwargs))
+
+        taskMgr.add = addTimed
+        taskMgr.doMethodLater = doMethodLaterTimed
+
+    def WrapTask(self, task):
+        if not isinstance(task, PythonTask) or task.getName().startswith('frame-profiler'):
+            return task
+
+        function = task.getFunction()
+        if function is None or getattr(function, 'profiled', False):
+            return task
+
+        stats = self.Stats(task.getName())
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                stats.Add(clock() - start)
+
+        timed.profiled = True
+        task.setFunction(timed)
+        return task
+
+    @contextmanager
+    def Measure(self, name: str):
+        stats = self.Stats(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.Add(time.perf_counter() - start)
+
+    def Update(self, task):
+        clock = ClockObject.getGlobalClock()
+        if self.frames > 0:
+            self.Stats('frame').Add(clock.getDt())
+        self.frames += 1
+
+        if self.overlay is not None and not self.overlay.isHidden() and clock.getRealTime() >= self.nextRefresh:
+            # Percentiles are recomputed a few times a second, not every frame.
+            self.nextRefresh = clock.getRealTime() + 0.25
+            self.overlayText.setText(self.Report())
+
+        if self.frameLimit and self.frames >= self.frameLimit:
+            messenger.send('frame-profiler-done', [self])
+            return task.done
+        return task.cont
+
+    def Summary(self) -> dict:
+        return {name: stats.Summary() for name, stats in self.stats.items()}
+
+    def Report(self, limit: int = 16) -> str:
+        summary = self.Summary()
+        names = sorted(summary, key=lambda name: summary[name]["totalMs"], reverse=True)[:limit]
+        lines = ["%-24s %7s %7s %7s" % ("task", "calls", "p50 ms", "p99 ms")]
+        for name in names:
+            row = summary[name]
+            lines.append("%-24s %7d %7.2f %7.2f" % (name[:24], row["calls"], row["p50Ms"], row["p99Ms"]))
+        return "\n".join(lines)
+
+    def ShowOverlay(self, parentNode: NodePath):
+        # The GUI modules are only worth importing once there is an overlay to show.
+        from direct.gui.OnscreenText import OnscreenText
+        from direct.gui.OnscreenImage import OnscreenImage
+
+        self.overlay = parentNode.attachNewNode('frame-profiler-overlay')
+        icon = OnscreenImage(image="./Assets/Hud/ReticleIV.png", pos=(-1.25, 0, 0.92), scale=0.035,
+                             parent=self.overlay)
+        icon.setTransparency(TransparencyAttrib.MAlpha)
+        self.overlayText = OnscreenText(text="", pos=(-1.2, 0.9), scale=0.04, fg=(0.6, 1, 0.6, 1),
+                                        align=TextNode.ALeft, mayChange=True, parent=self.overlay)
+
+    def ToggleOverlay(self):
+        if self.overlay.isHidden():
+            self.overlay.show()
+        else:
+            self.overlay.hide()
+
+    def Export(self, path: str = None):
+        """Writes the per-task summary as .csv or .json, chosen by the file extension."""
+        path = path or profilerTrace.getValue()
+        if not path:
+            return None
+
+        summary = self.Summary()
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="") as traceFile:
+                writer = csv.writer(traceFile)
+                writer.writerow(["name", "calls", "totalMs", "meanMs", "p50Ms", "p99Ms", "maxMs"])
+                for name, row in sorted(summary.items()):
+                    writer.writerow([name, row["calls"], "%.4f" % row["totalMs"], "%.4f" % row["meanMs"],
+                                     "%.4f" % row["p50Ms"], "%.4f" % row["p99Ms"], "%.4f" % row["maxMs"]])
+        else:
+            with open(path, "w") as traceFile:
+                json.dump({"frames": self.frames, "tasks": summary}, traceFile, indent=1, sort_keys=True)
+        return path
@@ -0,0 +1,281 @@
+from panda3d.core import NodePath, Vec3, Point3, ConfigVariableString, LODNode, RenderState
+from panda3d.core import CollisionNode, CollisionSphere, CollisionInvSphere, CollisionCapsule
+import hashlib, json, os
+import numpy as np
+import DefensePaths as defensePaths
+import PathBake as pathBake
+import SpaceJamClasses
+import AssetBuild
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+sceneFile = ConfigVariableString('scene-file', 'Assets/scene.json')
+
+SCENE_VERSION = 4
+
+BODY_CLASSES = {
+    "universe": SpaceJamClasses.Universe,
+    "planet": SpaceJamClasses.Planet,
+    "station": SpaceJamClasses.SpaceStation,
+}
+
+
+def CachePath(path: str, buildDir: str = AssetBuild.BUILD_DIR) -> str:
+    key = AssetBuild.SourceKey(path)
+    if os.path.isabs(key) or key.startswith("../"):
+        # Scenes outside the game directory are still cached under the build directory.
+        key = "scenes/" + os.path.basename(key) + "-" + hashlib.sha256(key.encode()).hexdigest()[:12]
+    return os.path.join(buildDir, key + ".npz").replace('\\', '/')
+
+
+def ReadSource(path: str) -> dict:
+    if path.lower().endswith(".toml"):
+        if tomllib is None:
+            raise ValueError(path + ": reading TOML scenes needs Python 3.11 or later")
+        with open(path, "rb") as sourceFile:
+            return tomllib.load(sourceFile)
+
+    with open(path) as sourceFile:
+        return json.load(sourceFile)
+
+
+def FormationSeed(formation: dict) -> int:
+    """A formation's (or wave's) own seed, or one derived from its contents, so a random formation compiles the
+    same way every time and never draws from the shared generator."""
+    if "seed" in formation:
+        return formation["seed"]
+    text = json.dumps(formation, sort_keys=True)
+    return int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+
+
+def WaveNames(wave: dict) -> list:
+    return [wave.get("name", "Alien{}").format(alien) for alien in range(wave["count"])]
+
+
+def FormationTable(formation: dict):
+    """Returns the (kind, params) of the baked path table a formation is read from, or None for formations
+    that are listed point by point."""
+    kind = formation["type"]
+    count = formation.get("count", 0)
+    if kind == "seams":
+        return "seams", {"samples": formation.get("steps", count), "B": formation.get("B", 0.4),
+                         "F": formation.get("F", 1)}
+    if kind == "cloud":
+        return "cloud", {"size": formation.get("size", count), "seed": FormationSeed(formation)}
+    if kind == "circle":
+        return "ring", {"samples": count}
+    return None
+
+
+def FormationTables(source: dict) -> list:
+    tables = (FormationTable(formation) for formation in source.get("formations", []))
+    return [table for table in tables if table is not None]
+
+
+def FormationOffsets(formation: dict, indices: np.ndarray) -> np.ndarray:
+    """Returns each drone's offset from the formation's center; indices are the numbers in the drones' names.
+    seams and cloud drones take slot index % steps (or size) of the shape, circle drones are spread evenly
+    along it, and points drones are listed one by one in offsets. Randomness comes from FormationSeed."""
+    kind = formation["type"]
+    radius = formation.get("radius", 1)
+    seed = FormationSeed(formation)
+    generator = np.random.default_rng(seed)
+    formation = dict(formation, seed=seed, count=len(indices))
+    table = FormationTable(formation)
+    units = pathBake.Table(table[0], **table[1]) if table is not None else None
+
+    if kind == "seams":
+        return units[indices % table[1]["samples"]] * radius
+    if kind == "cloud":
+        return units[indices % formation.get("size", len(indices))] * radius
+    if kind == "circle":
+        return defensePaths.CircleBatch(len(indices), formation.get("axis", "x"), radius, generator, units)
+    if kind == "points":
+        points = np.asarray(formation["offsets"], dtype=np.float32).reshape(-1, 3)
+        if len(points) < len(indices):
+            raise ValueError("points formation lists fewer offsets than its count")
+        return points[:len(indices)] * radius
+    raise ValueError("unknown formation type " + repr(kind))
+
+
+def Compile(source: dict) -> dict:
+    """Expands every formation into per-drone names, center offsets and scales, so loading does no per-drone
+    parsing or path math. Formation centers are named rather than placed, since bodies may move themselves."""
+    for body in source.get("bodies", []):
+        if body["type"] not in BODY_CLASSES:
+            raise ValueError("body " + body["name"] + ": unknown type " + repr(body["type"]))
+    for index, wave in enumerate(source.get("waves", [])):
+        if len(set(WaveNames(wave))) < wave["count"]:
+            raise ValueError("wave " + str(index) + ": alien names repeat; put {} in its name")
+
+    groups = []
+    names, offsets, scales, groupIds = [], [], [], []
+    for formation in source.get("formations", []):
+        first = formation.get("first", 0)
+        stride = formation.get("stride", 1)
+        count = formation["count"] if "count" in formation else len(formation["offsets"])
+        indices = first + stride * np.arange(count)
+        names.extend(formation.get("name", "Drone{}").format(index) for index in indices.tolist())
+        offsets.append(FormationOffsets(formation, indices).astype(np.float32))
+        scales.append(np.full(len(indices), formation.get("scale", 1), dtype=np.float32))
+        groupIds.append(np.full(len(indices), len(groups), dtype=np.int32))
+        groups.append({"model": formation["model"], "texture": formation["texture"], "center": formation["center"]})
+
+    return {
+        "header": {"bodies": source.get("bodies", []), "orbiters": source.get("orbiters", []),
+                   "waves": source.get("waves", []), "groups": groups},
+        "names": np.array(names, dtype=str),
+        "offsets": np.concatenate(offsets) if offsets else np.zeros((0, 3), dtype=np.float32),
+        "scales": np.concatenate(scales) if scales else np.zeros(0, dtype=np.float32),
+        "groups": np.concatenate(groupIds) if groupIds else np.zeros(0, dtype=np.int32),
+    }
+
+
+def SourceHash(path: str) -> str:
+    digest = hashlib.sha256(str(SCENE_VERSION).encode())
+    with open(path, "rb") as sourceFile:
+        digest.update(sourceFile.read())
+    return digest.hexdigest()
+
+
+def Load(path: str = None, buildDir: str = AssetBuild.BUILD_DIR) -> dict:
+    """Returns the compiled scene, read from its binary cache when that was built from the same source."""
+    path = path if path is not None else sceneFile.getValue()
+    sourceHash = SourceHash(path)
+    cachePath = CachePath(path, buildDir)
+    try:
+        with np.load(cachePath, allow_pickle=False) as cached:
+            header = json.loads(str(cached["header"]))
+            if header.get("hash") == sourceHash:
+                return {"header": header, "names": cached["names"], "offsets": cached["offsets"],
+                        "scales": cached["scales"], "groups": cached["groups"]}
+    except (OSError, KeyError, ValueError):
+        pass
+
+    compiled = Compile(ReadSource(path))
+    compiled["header"]["hash"] = sourceHash
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(cachePath, "wb") as cacheFile:
+            np.savez(cacheFile, header=np.array(json.dumps(compiled["header"])), names=compiled["names"],
+                     offsets=compiled["offsets"], scales=compiled["scales"], groups=compiled["groups"])
+    except OSError:
+        pass  # a read-only install still runs, it just compiles the scene every start
+    return compiled
+
+
+def MakeSolid(spec: dict):
+    kind = spec["type"]
+    if kind == "sphere":
+        return CollisionSphere(Point3(*spec.get("center", (0, 0, 0))), spec["radius"])
+    if kind == "invsphere":
+        return CollisionInvSphere(Point3(*spec.get("center", (0, 0, 0))), spec["radius"])
+    if kind == "capsule":
+        return CollisionCapsule(Point3(*spec["a"]), Point3(*spec["b"]), spec["radius"])
+    raise ValueError("unknown collision solid " + repr(kind))
+
+
+class SceneFile:
+    """A scene described in a JSON or TOML file: bodies, their collision solids, drone formations and orbiters,
+    built through the game's own classes."""
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else sceneFile.getValue()
+        compiled = Load(self.path)
+        self.header = compiled["header"]
+        self.names = compiled["names"]
+        self.offsets = compiled["offsets"]
+        self.scales = compiled["scales"]
+        self.groups = compiled["groups"]
+        self.bodies = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def BuildBodies(self, loader, parentNode: NodePath) -> dict:
+        for spec in self.header["bodies"]:
+            cls = BODY_CLASSES[spec["type"]]
+            posVec = Vec3(*spec.get("pos", (0, 0, 0)))
+            if spec["type"] == "station":
+                body = cls(loader, spec["model"], parentNode, spec["name"], posVec, spec["scale"], spec["texture"])
+            else:
+                body = cls(loader, spec["model"], parentNode, spec["name"], spec["texture"], posVec, spec["scale"])
+
+            if "collision" in spec:
+                collisionNode = body.collisionNode.node()
+                collisionNode.clearSolids()
+                for solid in spec["collision"]:
+                    collisionNode.addSolid(MakeSolid(solid))
+            self.bodies[spec["name"]] = body
+        return self.bodies
+
+    def BakeStatic(self):
+        """Flattens the visible geometry of every body, which never moves, into one GeomNode per LOD level (or
+        per model without LOD), with the model's own states pushed onto its Geoms. Runs once the collision nodes
+        have been moved out into the broadphase. Bodies stay separate nodes: formations, orbits and the scene
+        index follow them by node, and each streams in its own texture."""
+        for body in self.bodies.values():
+            for child in body.modelNode.getChildren():
+                if isinstance(child.node(), CollisionNode):
+                    continue
+                levels = child.getChildren() if isinstance(child.node(), LODNode) else [child]
+                for level in levels:
+                    # The level's own state holds the streamed texture, which must stay replaceable, so it is
+                    # kept off the Geoms.
+                    state = level.getState()
+                    level.setState(RenderState.makeEmpty())
+                    level.clearModelNodes()  # the loaded models' roots would otherwise survive flattening
+                    level.flattenStrong()
+                    level.setState(state)
+
+    def SpawnFormations(self, loader, parentNode: NodePath, batchSize: int = 1):
+        """Spawns the drones of every formation batchSize at a time, yielding after each batch, so it can run
+        as a simulation job. Runs after BuildBodies, which places the formation centers."""
+        for groupId, group in enumerate(self.header["groups"]):
+            rows = np.flatnonzero(self.groups == groupId)
+            center = np.asarray(self.bodies[group["center"]].modelNode.getPos(), dtype=np.float32)
+            for start in range(0, len(rows), max(1, batchSize)):
+                batch = rows[start:start + max(1, batchSize)]
+                SpaceJamClasses.Drone.SpawnMany(loader, group["model"], parentNode, self.names[batch].tolist(),
+                                                group["texture"], self.offsets[batch] + center, self.scales[batch])
+                yield
+
+    def BuildWaves(self, loader, taskMgr, parentNode: NodePath, anchors: dict) -> list:
+        """Builds one AlienWave per wave in the file, its aliens spread evenly around the center with radius,
+        speed and height varied by up to their spreads, drawn from the wave's FormationSeed."""
+        from AlienWave import AlienWave
+
+        named = dict(self.bodies, **anchors)
+        waves = []
+        for index, spec in enumerate(self.header.get("waves", [])):
+            count = spec["count"]
+            generator = np.random.default_rng(FormationSeed(spec))
+            wave = AlienWave(loader, parentNode, taskMgr, spec["model"], spec["texture"], spec.get("scale", 1),
+                             taskName="alien-wave-" + str(index))
+
+            def Spread(key, default):
+                if key + "Spread" not in spec:
+                    return np.full(count, spec.get(key, default))
+                return spec.get(key, default) + spec[key + "Spread"] * generator.uniform(-1, 1, count)
+
+            wave.Spawn(named[spec["center"]].modelNode, WaveNames(spec), Spread("radius", 1000), np.arange(count) * 2 * np.pi / count, Spread("speed", 0.5),
+                       Spread("height", 0))
+            waves.append(wave)
+        return waves
+
+    def BuildOrbiters(self, loader, taskMgr, parentNode: NodePath, anchors: dict) -> list:
+        """anchors maps names outside the file, such as the player's ship, to objects orbiters can center on
+        or stare at."""
+        named = dict(self.bodies, **anchors)
+        orbiters = []
+        for spec in self.header["orbiters"]:
+            scale = spec.get("scale", 1)
+            scaleVec = Vec3(*scale) if isinstance(scale, list) else Vec3(scale, scale, scale)
+            orbiters.append(SpaceJamClasses.Orbiter(
+                loader, taskMgr, spec["model"], parentNode, spec["name"], scaleVec, spec["texture"],
+                named[spec["center"]], spec["radius"], spec.get("type", "MLB"),
+                named[spec.get("staringAt", spec["center"])]))
+        return orbiters
@@ -0,0 +1,156 @@
+from panda3d.core import ClockObject, ConfigVariableDouble
+import math
+import numpy as np
+
+sceneIndexCellSize = ConfigVariableDouble('scene-index-cell-size', 1000)
+
+# Objects with these tags never move once placed, so their positions are read once per registration.
+STATIC_TAGS = ("universe", "planet", "station", "drone")
+
+
+class IndexEntry:
+    __slots__ = ('obj', 'nodePath', 'tag', 'static', 'position')
+
+    def __init__(self, obj, nodePath, tag: str, static: bool):
+        self.obj = obj
+        self.nodePath = nodePath
+        self.tag = tag
+        self.static = static
+        self.position = None
+
+
+class SceneIndex:
+    """Name and tag lookup plus nearest, radius and cone queries over registered objects, so callers never
+    search or walk the scene graph. Positions are gathered into a uniform grid at most once per frame,
+    and only when something is queried."""
+
+    def __init__(self, cellSize: float = None):
+        self.cellSize = cellSize if cellSize is not None else sceneIndexCellSize.getValue()
+        self.entries = {}  # name -> IndexEntry
+        self.byTag = {}  # tag -> {name: obj}
+
+        self.frame = -1
+        self.dirty = True
+        self.names = []
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.tags = np.zeros(0, dtype=np.int32)
+        self.tagIds = {}
+        self.cells = {}  # (i, j, k) -> row indices
+
+    def Add(self, obj, name: str = None, tag: str = None, nodePath=None):
+        nodePath = nodePath if nodePath is not None else obj.modelNode
+        name = name if name is not None else nodePath.getName()
+        tag = tag if tag is not None else getattr(obj, 'category', None)
+
+        self.Remove(name)
+        self.entries[name] = IndexEntry(obj, nodePath, tag, tag in STATIC_TAGS)
+        self.byTag.setdefault(tag, {})[name] = obj
+        self.dirty = True
+
+    def Remove(self, key):
+        """Unregisters by name, or by object if it is still registered under its node's name."""
+        name = key if isinstance(key, str) else key.modelNode.getName()
+        entry = self.entries.get(name)
+        if entry is None or (not isinstance(key, str) and entry.obj is not key):
+            return
+
+        del self.entries[name]
+        del self.byTag[entry.tag][name]
+        self.dirty = True
+
+    def __contains__(self, name: str):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def Find(self, name: str):
+        entry = self.entries.get(name)
+        return entry.obj if entry is not None else None
+
+    def Tagged(self, tag: str) -> list:
+        return list(self.byTag.get(tag, {}).values())
+
+    def Refresh(self):
+        frame = ClockObject.getGlobalClock().getFrameCount()
+        if frame == self.frame and not self.dirty:
+            return
+        self.frame = frame
+        self.dirty = False
+
+        self.names = list(self.entries)
+        positions = np.zeros((len(self.names), 3), dtype=np.float32)
+        tags = np.zeros(len(self.names), dtype=np.int32)
+        for row, entry in enumerate(self.entries.values()):
+            if entry.position is None or not entry.static:
+                entry.position = tuple(entry.nodePath.getPos())
+            positions[row] = entry.position
+            tags[row] = self.tagIds.setdefault(entry.tag, len(self.tagIds))
+        self.positions = positions
+        self.tags = tags
+
+        self.cells = {}
+        if len(positions):
+            cells = np.floor(positions / self.cellSize).astype(np.int64)
+            unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+            order = np.argsort(inverse.reshape(-1), kind='stable')
+            bounds = np.cumsum(np.bincount(inverse.reshape(-1), minlength=len(unique)))[:-1]
+            for cell, rows in zip(map(tuple, unique.tolist()), np.split(order, bounds)):
+                self.cells[cell] = rows
+
+    def Candidates(self, center, radius: float, tags=None) -> np.ndarray:
+        self.Refresh()
+        low = [math.floor((center[i] - radius) / self.cellSize) for i in range(3)]
+        high = [math.floor((center[i] + radius) / self.cellSize) for i in range(3)]
+        span = (high[0] - low[0] + 1) * (high[1] - low[1] + 1) * (high[2] - low[2] + 1)
+
+        if span >= len(self.cells):
+            rows = np.arange(len(self.names))
+        else:
+            found = [self.cells.get((i, j, k)) for i in range(low[0], high[0] + 1)
+                     for j in range(low[1], high[1] + 1) for k in range(low[2], high[2] + 1)]
+            found = [rows for rows in found if rows is not None]
+            rows = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+        if tags is not None:
+            tags = (tags,) if isinstance(tags, str) else tags
+            wanted = [self.tagIds[tag] for tag in tags if tag in self.tagIds]
+            rows = rows[np.isin(self.tags[rows], wanted)]
+        return rows
+
+    def Results(self, rows, distances) -> list:
+        order = np.argsort(distances, kind='stable')
+        return [(self.entries[self.names[rows[i]]].obj, float(distances[i])) for i in order.tolist()]
+
+    def Within(self, center, radius: float, tags=None) -> list:
+        """Returns (object, distance) pairs within radius of center, nearest first."""
+        rows = self.Candidates(center, radius, tags)
+        distances = np.linalg.norm(self.positions[rows] - np.asarray(tuple(center), dtype=np.float32), axis=1)
+        inside = distances <= radius
+        return self.Results(rows[inside], distances[inside])
+
+    def Nearest(self, center, k: int = 1, tags=None, exclude=None) -> list:
+        """Returns up to k (object, distance) pairs nearest center, widening the search a cell at a time."""
+        self.Refresh()
+        if not self.names:
+            return []
+
+        farthest = float(np.linalg.norm(self.positions - np.asarray(tuple(center), dtype=np.float32), axis=1).max())
+        radius = self.cellSize
+        while True:
+            found = [result for result in self.Within(center, radius, tags) if result[0] is not exclude]
+            if len(found) >= k or radius >= farthest:
+                return found[:k]
+            radius *= 2
+
+    def InCone(self, origin, direction, angle: float, distance: float, tags=None, exclude=None) -> list:
+        """Returns (object, distance) pairs within distance of origin and angle degrees of direction,
+        nearest first, e.g. what a missile fired along direction could be steered onto."""
+        rows = self.Candidates(origin, distance, tags)
+        offsets = self.positions[rows] - np.asarray(tuple(origin), dtype=np.float32)
+        distances = np.linalg.norm(offsets, axis=1)
+        aim = np.asarray(tuple(direction), dtype=np.float32)
+        aim /= max(np.linalg.norm(aim), 1e-9)
+        cosines = (offsets @ aim) / np.maximum(distances, 1e-9)
+        inside = (distances <= distance) & (cosines >= math.cos(math.radians(angle)))
+        return [result for result in self.Results(rows[inside], distances[inside]) if result[0] is not exclude]
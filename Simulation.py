@@ -0,0 +1,166 @@
+from panda3d.core import ClockObject, ConfigVariableDouble, ConfigVariableInt
+from direct.stdpy import threading
+
+simulationRate = ConfigVariableDouble('simulation-rate', 60)
+simulationMaxSteps = ConfigVariableInt('simulation-max-steps', 8)
+
+# Below every other task of a frame: ShowBase's resetPrevTransform (-51) and dataLoop (-50), the frame profiler
+# (-100) and texture delivery (-20) all touch scene state the ticks may be changing.
+SYNC_SORT = -1000
+
+
+class Simulation:
+    """Runs registered systems at a fixed rate from one task, independent of how fast frames are rendered.
+
+    Each rendered frame runs as many whole ticks as the elapsed time covers, then calls every render hook
+    with alpha, the fraction of a tick left over, so systems can draw between their last two states.
+
+    Given a taskChain, the ticks run on that chain's own thread instead. The main thread starts them once a
+    frame has been handed to rendering, and waits for them in the first task of the next frame, so no other
+    main-thread task runs while a tick is changing state."""
+
+    def __init__(self, taskMgr, rate: float = None, maxSteps: int = None, taskName: str = "simulation",
+                 taskChain: str = None):
+        self.stepSize = 1.0 / (rate if rate is not None else simulationRate.getValue())
+        self.maxSteps = maxSteps if maxSteps is not None else simulationMaxSteps.getValue()
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.ticks = 0
+        self.time = 0.0
+        self.droppedTime = 0.0
+        self.profiler = None
+
+        self.systems = []  # [sort, name, step, render], kept sorted
+        self.jobs = []  # [name, iterator, perTick]
+        self.taskMgr = taskMgr
+        self.taskChain = taskChain
+        self.frameTasks = []  # [name, work], run after each frame's ticks on the simulation's thread
+
+        if taskChain is None:
+            taskMgr.add(self.Update, taskName, sort=-10)
+            return
+
+        self.elapsed = 0.0
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.finished.set()
+        taskMgr.setupTaskChain(taskChain, numThreads=1)
+        taskMgr.add(self.ThreadTask, taskName + "-thread", taskChain=taskChain)
+        taskMgr.add(self.Sync, taskName + "-sync", sort=SYNC_SORT)
+        taskMgr.add(lambda task: self.Render() or task.cont, taskName, sort=-10)
+        # After igLoop (sort 50), so the ticks overlap culling and drawing rather than the scene's own tasks.
+        taskMgr.add(self.Start, taskName + "-start", sort=55)
+
+    @property
+    def threaded(self) -> bool:
+        return self.taskChain is not None
+
+    def Add(self, name: str, step, sort: int = 0, render=None):
+        """step(dt) runs once per tick in sort order; render(alpha), if given, runs once per rendered frame."""
+        self.Remove(name)
+        self.systems.append([sort, name, step, render])
+        self.systems.sort(key=lambda system: system[0])
+
+    def Remove(self, name: str):
+        self.systems = [system for system in self.systems if system[1] != name]
+        self.jobs = [job for job in self.jobs if job[0] != name]
+
+    def AddJob(self, name: str, work, perTick: int = 1):
+        """Advances the iterable work at most perTick items per tick, dropping it once it is exhausted."""
+        self.jobs.append([name, iter(work), perTick])
+
+    def HasJob(self, name: str) -> bool:
+        return any(job[0] == name for job in self.jobs)
+
+    def AddFrameTask(self, name: str, work, sort: int = 0):
+        """work() runs once per rendered frame: as a main-thread task at sort, or after the ticks on the
+        simulation's thread when it has one, since it reads or changes what the ticks do."""
+        if not self.threaded:
+            self.taskMgr.add(lambda task: work() or task.cont, name, sort=sort)
+            return
+        self.frameTasks.append([name, work])
+
+    def Tick(self):
+        for job in list(self.jobs):
+            name, work, perTick = job
+            for _ in range(perTick):
+                if next(work, StopIteration) is StopIteration:
+                    self.jobs.remove(job)
+                    break
+
+        for sort, name, step, render in self.systems:
+            if self.profiler is None:
+                step(self.stepSize)
+                continue
+            with self.profiler.Measure("tick " + name):
+                step(self.stepSize)
+
+        self.ticks += 1
+        self.time = self.ticks * self.stepSize
+
+    def Advance(self, dt: float):
+        self.accumulator += dt
+
+        steps = 0
+        while self.accumulator >= self.stepSize and steps < self.maxSteps:
+            self.Tick()
+            self.accumulator -= self.stepSize
+            steps += 1
+
+        if self.accumulator >= self.stepSize:
+            # Too far behind to catch up (a stall or a breakpoint): skip the backlog instead of spiraling.
+            skipped = self.accumulator - self.accumulator % self.stepSize
+            self.droppedTime += skipped
+            self.accumulator -= skipped
+
+        self.alpha = self.accumulator / self.stepSize
+
+    def Render(self):
+        for sort, name, step, render in self.systems:
+            if render is not None:
+                render(self.alpha)
+
+    def Update(self, task):
+        self.Advance(ClockObject.getGlobalClock().getDt())
+        self.Render()
+        return task.cont
+
+    def Sync(self, task):
+        # The sync point: the ticks started last frame must be done before anything reads or draws their state.
+        self.finished.wait()
+        return task.cont
+
+    def Start(self, task):
+        self.elapsed = ClockObject.getGlobalClock().getDt()
+        self.finished.clear()
+        self.started.set()
+        return task.cont
+
+    def ThreadTask(self, task):
+        # Waits in short slices, so the chain can still be stopped when the game exits.
+        self.started.wait(0.1)
+        if not self.started.is_set():
+            return task.cont
+        self.started.clear()
+
+        try:
+            self.Advance(self.elapsed)
+            for name, work in self.frameTasks:
+                if self.profiler is None:
+                    work()
+                    continue
+                with self.profiler.Measure("frame " + name):
+                    work()
+        finally:
+            self.finished.set()
+        return task.cont
+
+    def Stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "time": self.time,
+            "droppedTime": self.droppedTime,
+            "systems": [system[1] for system in self.systems],
+            "jobs": [job[0] for job in self.jobs],
+            "threaded": self.threaded,
+        }
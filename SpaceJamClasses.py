@@ -1,52 +1,55 @@
 from panda3d.core import NodePath, Vec3, CollisionNode, CollisionSphere, Filename
 import random, math
-from direct.task import Task
-from direct.task.Task import TaskManager
+import numpy as np
 from CollideObjectBase import SphereCollideObject, InverseSphereCollideObject, CollideableObject, CapsuleCollideableObject
-import DefensePaths as defensePaths
 from CollideObjectBase import PlacedObject
-from panda3d.core import CollisionTraverser, CollisionHandlerEvent
+from panda3d.core import CollisionTraverser, CollisionHandlerEvent, CollisionSegment
+from DroneSwarm import SwarmDrone
+from OrbitSystem import OrbitSystem, ORBIT_NAMES
+from Broadphase import AssignMasks
+from ObjectPool import ObjectPool, PlaceModel
+from LevelOfDetail import LODModel, PLANET_LEVELS, STATION_LEVELS, lodEnabled
+from EventLog import eventLog
 
 
 class Universe(InverseSphereCollideObject):
+    category = "universe"
+
     def __init__(self, loader, modelPath, parentNode, nodeName, texPath, posVec, scaleVec):
         super().__init__(loader, modelPath, parentNode, nodeName, Vec3(0, 0, 0), 0.9)
-        self.modelNode = loader.loadModel(modelPath)
-        self.modelNode.reparentTo(parentNode)
         self.modelNode.setPos(posVec)
         self.modelNode.setScale(scaleVec)
-        self.modelNode.setName(nodeName)
-        tex = loader.loadTexture(texPath)
-        self.modelNode.setTexture(tex, 1)
+        PlacedObject.StreamTexture(loader, texPath, self.SetTexture)
 
 class Planet(CollideableObject):
+    category = "planet"
+
     def __init__(self, loader, modelPath, parentNode, nodeName, texPath, posVec, scaleVec):
         super().__init__(loader, modelPath, parentNode, nodeName)
         self.modelNode.setPos(posVec)
         self.modelNode.setScale(scaleVec)
-        tex = loader.loadTexture(texPath)
-        self.modelNode.setTexture(tex, 1)
-        self.collisionNode.node().addSolid(CollisionSphere(0, 0, 0, 1.0 * scaleVec))
+        self.lod = LODModel(self.modelNode, PLANET_LEVELS if lodEnabled.getValue() else ())
+        PlacedObject.StreamTexture(loader, texPath, self.lod.SetTexture)
+        # protoPlanet is a unit sphere and the node is already scaled, so the solid stays at radius 1
+        self.collisionNode.node().addSolid(CollisionSphere(0, 0, 0, 1.0))
 
 class Drone(CollideableObject):
+    category = "drone"
     droneCount = 0
-    dronePool = []
+    dronePools = {}
+    swarm = None
+    broadphase = None
+
+    __slots__ = ('loader', 'poolKey')
 
     def __init__(self, loader, modelPath, parentNode, nodeName, texPath, posVec, scaleVec):
+        self.loader = loader
+        self.poolKey = (modelPath, texPath)
         super().__init__(loader, modelPath, parentNode, nodeName)
         
-        if Drone.dronePool:
-            self.modelNode = Drone.dronePool.pop()
-            self.modelNode.reparentTo(parentNode)
-            self.collisionNode = self.modelNode.attachNewNode(CollisionNode(nodeName + '_cNode'))
-        else:
-            self.modelNode = loader.loadModel(modelPath)
-            self.modelNode.reparentTo(parentNode)
-            self.collisionNode = self.modelNode.attachNewNode(CollisionNode(nodeName + '_cNode'))
-        
         self.modelNode.setPos(posVec)
         self.modelNode.setScale(scaleVec)
-        tex = loader.loadTexture(texPath)
+        tex = PlacedObject.LoadTexture(loader, texPath)
         self.modelNode.setTexture(tex, 1)
         
         Drone.droneCount += 1
@@ -57,188 +60,177 @@ class Drone(CollideableObject):
         # Add a collision shape (e.g., a CollisionSphere)
         collision_node.addSolid(CollisionSphere(0, 0, 0, 5))  # Adding collision shape
         
-        # Now apply the collision masks directly to the CollisionNode
-        collision_node.setFromCollideMask(1)  # Set the collide mask for the node
-        collision_node.setIntoCollideMask(1)  # Optionally, set the into collide mask
+        # Drones are only ever hit, so they get the drone into-mask and no from-mask
+        AssignMasks(self.collisionNode, "drone")
+        if Drone.broadphase is not None:
+            Drone.broadphase.AddStatic(self.collisionNode, "drone", nodeName)
 
     @staticmethod
-    def return_to_pool(drone):
-        if hasattr(drone, 'collisionNode') and drone.collisionNode is not None:
-            drone.collisionNode.removeNode()
-        Drone.dronePool.append(drone.modelNode)
+    def UsesSwarm(modelPath, texPath):
+        return Drone.swarm is not None and Drone.swarm.modelPath == modelPath and Drone.swarm.texPath == texPath
+
+    @staticmethod
+    def Pool(loader, modelPath, parentNode, texPath, scaleVec) -> ObjectPool:
+        key = (modelPath, texPath)
+        if key not in Drone.dronePools:
+            Drone.dronePools[key] = ObjectPool(
+                lambda: Drone(loader, modelPath, parentNode, 'PooledDrone', texPath, Vec3(0, 0, 0), scaleVec),
+                reset=Drone.Reset, release=Drone.Release)
+        return Drone.dronePools[key]
+
+    @staticmethod
+    def Spawn(loader, modelPath, parentNode, nodeName, texPath, posVec, scaleVec):
+        """Takes a drone from the pool for its model and texture, only constructing one when none are free.
+        Swarm drones are returned as their SwarmDrone handle, a row in the swarm's arrays rather than an object
+        with its own nodes."""
+        if Drone.UsesSwarm(modelPath, texPath):
+            handle = Drone.swarm.Spawn(nodeName, posVec, scaleVec)
+            Drone.droneCount += 1
+            PlacedObject.Register(handle)
+            return handle
+
+        pool = Drone.Pool(loader, modelPath, parentNode, texPath, scaleVec)
+        allocations = pool.allocations
+        drone = pool.Acquire(parentNode, nodeName, posVec, scaleVec)
+        if pool.allocations == allocations:
+            Drone.droneCount += 1  # the constructor already counted freshly built drones
+        return drone
+
+    @staticmethod
+    def SpawnMany(loader, modelPath, parentNode, names, texPath, positions, scales) -> list:
+        """Spawns a drone for each name from an (N, 3) array of positions and N scales. Swarm drones are
+        added to the instance array in one batch."""
+        if not Drone.UsesSwarm(modelPath, texPath):
+            return [Drone.Spawn(loader, modelPath, parentNode, name, texPath, Vec3(*position), scale)
+                    for name, position, scale in zip(names, positions.tolist(), scales.tolist())]
+
+        handles = Drone.swarm.SpawnMany(names, positions, scales)
+        Drone.droneCount += len(handles)
+        for handle in handles:
+            PlacedObject.Register(handle)
+        return handles
+
+    @staticmethod
+    def Reset(drone, parentNode, nodeName, posVec, scaleVec):
+        Drone.Release(drone)
+        PlaceModel(drone, parentNode, nodeName, posVec, scaleVec)
+        if Drone.broadphase is not None:
+            Drone.broadphase.AddStatic(drone.collisionNode, "drone", nodeName)
+
+    @staticmethod
+    def Release(drone):
+        PlacedObject.Unregister(drone)
+        # Pull the collision node back from the broadphase so it travels with the pooled model.
+        if drone.collisionNode.getParent() != drone.modelNode:
+            drone.collisionNode.reparentTo(drone.modelNode)
+            drone.collisionNode.clearTransform()
         drone.modelNode.detachNode()
 
+    @staticmethod
+    def return_to_pool(drone):
+        if isinstance(drone, SwarmDrone):
+            PlacedObject.Unregister(drone)
+            drone.removeNode()
+            return
+
+        modelPath, texPath = drone.poolKey
+        Drone.Pool(drone.loader, modelPath, drone.modelNode.getParent(), texPath, drone.modelNode.getScale()).Release(drone)
+
 
 
 
 
 class SpaceStation(CapsuleCollideableObject):
+    category = "station"
+
     def __init__(self, loader, modelPath, parentNode, nodeName, posVec, scaleVec, texPath):
         super().__init__(loader, modelPath, parentNode, nodeName, 1, -1, 5, 1, -1, -5, 10)
-        self.modelNode = loader.loadModel(modelPath)
-        self.modelNode.reparentTo(parentNode)
         self.modelNode.setPos(Vec3(100, 200, 300))  # Fixed position override issue
         self.modelNode.setScale(scaleVec)
-        self.modelNode.setName(nodeName)
-        tex = loader.loadTexture(texPath)
-        self.modelNode.setTexture(tex, 1)
+        self.lod = LODModel(self.modelNode, STATION_LEVELS if lodEnabled.getValue() else ())
+        PlacedObject.StreamTexture(loader, texPath, self.lod.SetTexture)
 
 class Missile(SphereCollideObject):
-    def __init__(self, loader, modelPath, parentNode, nodeName, posVec, scaleVec, missileBay, missileDistance):
+    """While in flight, a missile's position, velocity and distance flown are a row of its launcher's arrays."""
+    __slots__ = ('parentNode', 'missileBay', 'missileDistance', 'missileSpeed', 'sweepNode', 'flightRow')
+    category = "missile"
+
+    def __init__(self, loader, modelPath, parentNode, nodeName, posVec, scaleVec, missileBay, missileDistance,
+                 missileSpeed=2000):
         super().__init__(loader, modelPath, parentNode, nodeName, posVec, scaleVec)
+        self.parentNode = parentNode
         self.missileBay = missileBay
         self.missileDistance = missileDistance
-        self.traverser = CollisionTraverser()
-        self.handler = CollisionHandlerEvent()
+        self.missileSpeed = missileSpeed
+        AssignMasks(self.collisionNode, "missile")
+        self.flightRow = -1
+
+        # Hits are found by sweeping a segment over the ground covered each frame, so fast missiles can't tunnel.
+        self.sweepNode = parentNode.attachNewNode(CollisionNode(nodeName + '_sweep'))
+        self.sweepNode.node().addSolid(CollisionSegment(0, 0, 0, 0, 1, 0))
+        AssignMasks(self.sweepNode, "missile")
+
+    @property
+    def inFlight(self) -> bool:
+        return self.flightRow >= 0
 
-    def Fire(self):
+    def Fire(self, origin: NodePath = None):
+        """Lines the missile up with origin and returns its velocity, or None if the bay is empty."""
         if self.missileBay > 0:
+            if origin is not None:
+                self.modelNode.setPosQuat(origin.getPos(self.parentNode), origin.getQuat(self.parentNode))
+
             aim = self.modelNode.getQuat().getForward()  
             aim.normalize()
 
-            self.traverser.addCollider(self.collisionNode, self.handler)
-
-            self.modelNode.setPos(self.modelNode.getPos() + aim * self.missileDistance)
-
-            print(f"Missile Fired! Moving in direction {aim} for {self.missileDistance} units.")
+            eventLog.Log("missile-fired", "Missile Fired! Moving in direction %s for %s units.", aim,
+                         self.missileDistance)
+            return aim * self.missileSpeed
         else:
-            print("No missiles available to fire.")
+            eventLog.Log("missile-empty", "No missiles available to fire.")
+            return None
 
 class Orbiter(SphereCollideObject):
+    """A visible model whose orbit parameters, position and stare target live in a row of the shared
+    OrbitSystem; the object itself only remembers that row."""
+    __slots__ = ('orbitRow',)
     # Class variables must be declared before they're used.
+    category = "orbiter"
     numOrbits = 0
     velocity = 0.005
     cloudTimer = 240
+    system = None
+    simulation = None
 
     def __init__(self, loader, taskMgr, modelPath: str, parentNode: NodePath, nodeName: str, 
                  scaleVec: Vec3, texPath: str, centralObject, orbitRadius: float, 
                  orbitType: str, staringAt):
         # Initialize the base class with a default collision center and radius.
         super(Orbiter, self).__init__(loader, modelPath, parentNode, nodeName, Vec3(0, 0, 0), 3.2)
-        
-        self.taskMgr = taskMgr
-        self.orbitType = orbitType
+        self.orbitRow = -1
 
         self.modelNode.setScale(scaleVec)
-        tex = loader.loadTexture(texPath)
+        tex = PlacedObject.LoadTexture(loader, texPath)
         self.modelNode.setTexture(tex, 1)
-        
-        self.orbitObject = centralObject
-        self.orbitRadius = orbitRadius
-        self.staringAt = staringAt
 
-        # Increment the class variable and store it in the instance (if needed).
+        # The class count doubles as each orbiter's period along the seams.
         Orbiter.numOrbits += 1
-        self.numOrbits = Orbiter.numOrbits
-
-        self.cloudClock = 0
-        self.taskFlag = "Traveler-" + str(self.numOrbits)
-        
-        # Add the orbit task.
-        self.taskMgr.add(self.Orbit, self.taskFlag)
-
-    def Orbit(self, task):
-        if self.orbitType == "MLB":
-            # Calculate the new position using the MLB orbit function.
-            positionVec = defensePaths.BaseballSeams(task.time * Orbiter.velocity, self.numOrbits, 2.0)
-            newPos = positionVec * self.orbitRadius + self.orbitObject.modelNode.getPos()
-            self.modelNode.setPos(newPos)
-        elif self.orbitType == "Cloud":
-            if self.cloudClock < Orbiter.cloudTimer:
-                self.cloudClock += 1
-            else:
-                self.cloudClock = 0
-                positionVec = defensePaths.Cloud()
-                newPos = positionVec * self.orbitRadius + self.orbitObject.modelNode.getPos()
-                self.modelNode.setPos(newPos)
-        
-        self.modelNode.lookAt(self.staringAt.modelNode)
-        return task.cont
-
-                 
-                 
-       
-
-class Alien:
-    def __init__(self, loader, modelPath, parentNode, nodeName, texPath, scale, planetNode, traverser, handler):
-        # Create the alien model
-        self.modelNode = loader.loadModel(modelPath)
-        self.modelNode.reparentTo(parentNode)
-        self.modelNode.setScale(scale)
-        self.modelNode.setName(nodeName)
-
-        # Set up the texture
-        tex = loader.loadTexture(texPath)
-        self.modelNode.setTexture(tex)
-
-        # Reference to the planet node
-        self.planetNode = planetNode
-
-        # Rotation parameters
-        self.orbitRadius = 200  # Distance from planet
-        self.orbitSpeed = 0.5  # Speed of rotation (adjust as needed)
-        self.angle = 0  # Start angle
-
-        # Collision Setup
-        self.traverser = traverser
-        self.handler = handler
 
-        self.collisionNode = CollisionNode(nodeName + "_collider")
-        self.collisionNode.addSolid(CollisionSphere(0, 0, 0, scale * 1.5))  # Adjust size
-        self.collisionNode.setTag("type", "alien")
+        # Every orbiter is a row in the shared OrbitSystem instead of having its own task.
+        Orbiter.System(taskMgr).Add(self, orbitType, orbitRadius, centralObject.modelNode, staringAt.modelNode,
+                                    period=Orbiter.numOrbits)
 
-        self.collisionNodePath = self.modelNode.attachNewNode(self.collisionNode)
-        traverser.addCollider(self.collisionNodePath, handler)
-
-        handler.addInPattern("%fn-into")  # Setup collision event pattern
-
-    def Update(self, task):
-        # Calculate new position based on circular motion
-        self.angle += self.orbitSpeed * task.dt  # Increase angle over time
-        x = self.planetNode.getX() + self.orbitRadius * math.cos(self.angle)
-        y = self.planetNode.getY() + self.orbitRadius * math.sin(self.angle)
-        z = self.planetNode.getZ()  # Keep the alien at the same height
-
-        self.modelNode.setPos(Vec3(x, y, z))
-
-        return task.cont
-
-    def Destroy(self):
-        print("Alien destroyed!")
-        self.modelNode.removeNode()  # Remove the alien from the scene
-
-
-
-
-def create_drone_circle(centralObject, numDrones, axis='x', radius=1):
-    """Creates a formation of drones in a circle around an object."""
-    angleStep = 2 * math.pi / numDrones
-    
-    for i in range(numDrones):
-        angle = i * angleStep
-        position = Vec3()
-
-        if axis == 'x':
-            position.setX(math.cos(angle) * radius)
-            position.setY(random.uniform(-0.5, 0.5))
-            position.setZ(random.uniform(-0.5, 0.5))
-        elif axis == 'y':
-            position.setX(random.uniform(-0.5, 0.5))
-            position.setY(math.cos(angle) * radius)
-            position.setZ(random.uniform(-0.5, 0.5))
-        else:
-            position.setX(random.uniform(-0.5, 0.5))
-            position.setY(random.uniform(-0.5, 0.5))
-            position.setZ(math.cos(angle) * radius)
-        
-        position += centralObject.modelNode.getPos()
-
-        Drone(
-            centralObject.loader,
-            "./Assets/DroneDefender/DroneDefender.obj",
-            centralObject.render,
-            f"Drone-{i}",
-            "./Assets/DroneDefender/octotoad1_auv.png",
-            position,
-            5
-        )
+    @staticmethod
+    def System(taskMgr):
+        if Orbiter.system is None:
+            Orbiter.system = OrbitSystem(taskMgr, Orbiter.velocity, Orbiter.cloudTimer,
+                                         simulation=Orbiter.simulation)
+        return Orbiter.system
+
+    @property
+    def orbitType(self) -> str:
+        return ORBIT_NAMES[int(Orbiter.system.kind[self.orbitRow])]
+
+    @property
+    def orbitRadius(self) -> float:
+        return float(Orbiter.system.radius[self.orbitRow])
@@ -1,103 +1,236 @@
+import sys
+from Startup import startup
+
+# Imports are timed from here on. argparse has not run yet, so the flag is looked for directly.
+if __name__ == "__main__" and "--startup-report" in sys.argv[1:]:
+    startup.TimeImports()
+
 from direct.showbase.ShowBase import ShowBase
-import math, sys, random
-import DefensePaths as defensePaths
+import argparse
 import SpaceJamClasses as SpaceJamClasses
-from panda3d.core import Vec3, CollisionTraverser, CollisionHandlerPusher
+from panda3d.core import Vec3, CollisionTraverser, CollisionHandlerPusher, ConfigVariableInt, ConfigVariableString, loadPrcFileData
 from Player import Spaceship
-from SpaceJamClasses import Missile, Alien
+from AssetCache import AssetCache
+from CollideObjectBase import PlacedObject, debugCollisions
+from Broadphase import Broadphase, COLLIDES_WITH
+from Profiler import FrameProfiler, profilerEnabled
+from Simulation import Simulation
+from SceneIndex import SceneIndex
+from CollisionDispatcher import CollisionDispatcher
+from EventLog import eventLog
+from SceneFile import SceneFile
+from LevelOfDetail import LODModel
+
+droneSpawnPerTick = ConfigVariableInt('drone-spawn-per-tick', 1)
+# single runs everything on the main thread. threaded ticks the simulation and traverses collisions on their own
+# task chain thread, and culls and draws in the App/Cull/Draw pipeline.
+gameThreading = ConfigVariableString('game-threading', 'single')
 
 class MyApp(ShowBase):
-    def __init__(self):
-        ShowBase.__init__(self)
+    def __init__(self, startupReport: bool = False):
+        threaded = gameThreading.getValue() == 'threaded'
+        if threaded:
+            # Read when the window is opened, so it has to be in place before ShowBase starts.
+            loadPrcFileData('game-threading', 'threading-model Cull/Draw')
+        with startup.Phase("window"):
+            ShowBase.__init__(self)
         self.rootAssetFolder = "Assets"
-
-        self.SetupScene()
-
-        self.taskMgr.add(self.SpawnDronesTask, "SpawnDronesTask")
-        
-        
-        self.Hero = Spaceship(self.loader, self.accept, "Assets/Spaceships/spacejet.3ds", self.render, 'Hero', 
-                              "Assets/Spaceships/spacejet_C.png", Vec3(1000, 1200, -58), Vec3(58, 58, 58), self.taskMgr, self.camera)
-        
-        self.Hero.SetKeyBindings()
-
-        # Collision setup
-        self.cTrav = CollisionTraverser()
-        self.pusher = CollisionHandlerPusher()
-        self.pusher.addCollider(self.Hero.collisionNode, self.Hero.modelNode)
-        self.cTrav.addCollider(self.Hero.collisionNode, self.pusher)
-        self.cTrav.showCollisions(self.render)
+        self.startupReport = startupReport
+
+        self.profiler = None
+        if profilerEnabled.getValue():
+            self.profiler = FrameProfiler(self.taskMgr, overlayParent=self.aspect2d if self.win else None,
+                                          accept=self.accept)
+            self.exitFunc = self.profiler.Export
+            self.accept("frame-profiler-done", self.OnProfilerDone)
+
+        # Gameplay advances in fixed ticks; only drawing and the hero's collision push run per frame.
+        self.simulation = Simulation(self.taskMgr, taskChain='simulation-thread' if threaded else None)
+        self.simulation.profiler = self.profiler
+        SpaceJamClasses.Orbiter.simulation = self.simulation
+
+        self.assetCache = AssetCache(self.loader, taskMgr=self.taskMgr)
+        PlacedObject.assetCache = self.assetCache
+        self.sceneIndex = SceneIndex()
+        PlacedObject.sceneIndex = self.sceneIndex
+        self.assetCache.Preload("Assets/preload.json", self.taskMgr)
+
+        with startup.Phase("scene"):
+            LODModel.deferred = []
+            self.SetupScene()
+
+        with startup.Phase("collisions"):
+            self.broadphase = Broadphase(self.render)
+            self.broadphase.profiler = self.profiler
+            self.RegisterStaticBodies()
+            self.collisions = CollisionDispatcher(self.taskMgr)
+            self.collisions.profiler = self.profiler
+            SpaceJamClasses.Drone.broadphase = self.broadphase
+
+        with startup.Phase("ship"):
+            self.Hero = Spaceship(self.loader, self.accept, "Assets/Spaceships/spacejet.3ds", self.render, 'Hero', 
+                                  "Assets/Spaceships/spacejet_C.png", Vec3(1000, 1200, -58), Vec3(58, 58, 58), self.taskMgr, self.camera,
+                                  self.simulation)
+            self.Hero.SetKeyBindings()
+
+            # Collision setup: only the broadphase grid is traversed, not the whole render graph. The pusher keeps
+            # the ship out of everything it hits; each new contact is handed on to the dispatcher to be logged.
+            self.traverser = CollisionTraverser('hero-collisions')
+            self.pusher = CollisionHandlerPusher()
+            self.pusher.addCollider(self.Hero.collisionNode, self.Hero.modelNode)
+            self.pusher.addInPattern("ship-contact")
+            self.accept("ship-contact", self.collisions.Add)
+            self.traverser.addCollider(self.Hero.collisionNode, self.pusher)
+            if debugCollisions.getValue():
+                self.traverser.showCollisions(self.render)
+            self.simulation.AddFrameTask("collision-broadphase", self.TraverseCollisions, sort=30)
+            for category in COLLIDES_WITH["ship"]:
+                self.collisions.On("ship", category, self.Hero.OnContacts)
 
         # Camera settings
         #self.freeCamera = False
         #self.cameraMode = "third_person"
 
-        self.planet3 = self.render.find("**/planet3")  
-
-        if not self.planet3.isEmpty():
-            print("Planet3 found, spawning alien.")
-            self.alien = Alien(self.loader, "Assets/Spaceships/spacejet.3ds", self.render, "Alien",
-                               "./Assets/Spaceships/redufo.png", 2, self.planet3, self.cTrav, self.pusher)
-            self.taskMgr.add(self.alien.Update, "UpdateAlien")
-        else:
-            print("Planet3 not found! Alien cannot orbit.")
-
-        self.accept("missile_collider-into-alien_collider", self.OnMissileHitAlien)
-
-
-
-    def OnMissileHitAlien(self, collisionEntry):
-        print("Missile hit the alien!")
-        self.alien.Destroy()
+        # The bodies and the ship are enough for a first frame; everything else is set up once it is drawn.
+        # Just after igLoop (50) and before the simulation thread starts its next tick (55).
+        self.taskMgr.add(self.FinishStartup, "finish-startup", sort=51)
+
+    def FinishStartup(self, task):
+        startup.FirstFrame()
+        # Nothing before the first frame uses these, so they are imported only now.
+        from AlienWave import AlienWave
+        from DroneSwarm import DroneSwarm, swarmEnabled
+        from Explosions import ExplosionSystem
+        from MissileLauncher import MissileLauncher
+
+        with startup.Phase("explosions"):
+            self.explosions = ExplosionSystem(self.render, self.taskMgr, simulation=self.simulation)
+            AlienWave.explosions = self.explosions
+
+        with startup.Phase("drones"):
+            if swarmEnabled.getValue():
+                SpaceJamClasses.Drone.swarm = DroneSwarm(self.loader, self.render, self.win, "./Assets/DroneDefender/DroneDefender.obj",
+                                                         "./Assets/DroneDefender/octotoad1_auv.png", self.taskMgr,
+                                                         broadphase=self.broadphase)
+            self.simulation.AddJob("spawn-drones", self.SpawnDrones())
+
+        with startup.Phase("missiles"):
+            self.Hero.launcher = MissileLauncher(self.loader, self.render, self.taskMgr, self.broadphase,
+                                                 "./Assets/Spaceships/Dumbledore.egg", self.Hero.reloadTime,
+                                                 self.Hero.missileDistance, simulation=self.simulation,
+                                                 dispatcher=self.collisions)
+
+        with startup.Phase("orbiters"):
+            self.orbiters = self.scene.BuildOrbiters(self.loader, self.taskMgr, self.render, {"Hero": self.Hero})
+
+        # Aliens fly in waves from the scene file, updated less often the further they are from the ship.
+        with startup.Phase("aliens"):
+            AlienWave.broadphase = self.broadphase
+            AlienWave.simulation = self.simulation
+            AlienWave.viewer = self.Hero.modelNode
+            if self.win is not None:
+                AlienWave.camera, AlienWave.lens = self.cam, self.camLens
+            self.waves = self.scene.BuildWaves(self.loader, self.taskMgr, self.render, {"Hero": self.Hero})
+
+        # Hits arrive once per frame as one batch for each pair of categories.
+        self.collisions.On("missile", "drone", self.OnMissileHitDrones)
+        self.collisions.On("missile", "alien", self.OnMissileHitAliens)
+        self.collisions.On("missile", "planet", self.OnMissileHitScenery)
+        self.collisions.On("missile", "station", self.OnMissileHitScenery)
+
+        # One reduced LOD mesh per frame, then the bodies are flattened with their final levels.
+        scenery = self.BakeScenery()
+        self.taskMgr.add(lambda task: task.cont if next(scenery, False) is None else task.done, "bake-scenery",
+                         sort=51)
+        return task.done
+
+    def BakeScenery(self):
+        # The last of startup, so the report comes at its end.
+        reductions = LODModel.ReduceDeferred()
+        while True:
+            with startup.Phase("lod-meshes"):
+                reduced = next(reductions, False) is None
+            if not reduced:
+                break
+            yield
+        with startup.Phase("bake-static"):
+            self.scene.BakeStatic()
+
+        if self.startupReport:
+            startup.StopImports()
+            print(startup.Report())
+
+    def OnProfilerDone(self, profiler):
+        print(profiler.Report(limit=32))
+        self.userExit()
+
+    def TraverseCollisions(self):
+        self.broadphase.Traverse(self.traverser)
+
+    def RegisterStaticBodies(self):
+        for body in self.scene.bodies.values():
+            self.broadphase.AddStatic(body.collisionNode, body.category)
+
+    def OnMissileHitDrones(self, batch):
+        # Swarm drones are found by row, pooled drones by their body's key; both go back through the pool.
+        # Several missiles can strike the same drone in one frame; it is only removed once.
+        swarm = SpaceJamClasses.Drone.swarm
+        positions, radii = [], []
+        for entry in batch.entries:
+            drone = swarm.FindByCollision(entry) if swarm is not None else None
+            if drone is not None:
+                if drone.isEmpty():
+                    continue
+                name, nodePath, radius = drone.getName(), drone, swarm.colRadius
+            else:
+                drone = self.sceneIndex.Find(self.broadphase.Find(entry))
+                if not isinstance(drone, SpaceJamClasses.Drone):
+                    continue
+                nodePath = drone.modelNode
+                name, radius = nodePath.getName(), drone.collisionNode.node().getSolid(0).getRadius()
+            eventLog.Log("missile-hit", "Missile hit %s!", name)
+            positions.append(tuple(nodePath.getPos(self.render)))
+            radii.append(radius * nodePath.getScale().x)
+            SpaceJamClasses.Drone.return_to_pool(drone)
+        # Every drone killed this frame explodes from one batch.
+        self.explosions.ExplodeMany(positions, radii)
+
+    def OnMissileHitAliens(self, batch):
+        # Each alien's body in the broadphase is keyed by its wave and name, which finds the alien and so its wave.
+        hit = {}
+        for entry in batch.entries:
+            alien = self.sceneIndex.Find(self.broadphase.Find(entry))
+            if alien is not None and alien.waveRow >= 0:
+                eventLog.Log("missile-hit", "Missile hit %s!", alien.modelNode.getName())
+                hit.setdefault(alien.wave, []).append(alien)
+        for wave, aliens in hit.items():
+            wave.DestroyMany(aliens)
+
+    def OnMissileHitScenery(self, batch):
+        eventLog.Log("missile-miss", "%d missile(s) hit a %s.", len(batch), batch.intoCategory)
 
     def SetupScene(self):
-        self.Universe = SpaceJamClasses.Universe(self.loader, "./Assets/Universe/Universe.obj", self.render, 'Universe', "Assets/Universe/Universe2.jpg", (0, 0, 0), 18008)
-        self.Planet1 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet1', "./Assets/Planets/WaterPlanet2.png", (-6000, -3000, -800), 250)
-        self.Planet2 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet2', "./Assets/Planets/planet1.png", (0, 6000, 0), 300)
-        self.Planet3 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet3', "./Assets/Planets/cheeseplanet.png", (500, -5000, 200), 500)
-        self.Planet4 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet4', "./Assets/Planets/grplanet.png", (300, 6000, 500), 150)
-        self.Planet5 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet5', "./Assets/Planets/redplanet.png", (700, -2000, 100), 500)
-        self.Planet6 = SpaceJamClasses.Planet(self.loader, "./Assets/Planets/protoPlanet.x", self.render, 'Planet6', "./Assets/Planets/planet3.jpg", (0, -980, -1480), 780)
-        self.SpaceStation1 = SpaceJamClasses.SpaceStation(
-            self.loader, 
-            "./Assets/SpaceStation/spaceStation.x", 
-            self.render, 
-            'SpaceStation1', 
-            (1500, 1800, -100),
-            40,
-            "./Assets/SpaceStation/SpaceStation1_Dif2.png"
-        )
-
-
-    def DrawBaseballSeams(self, centralObject, droneName, step, numSeams, radius=1):
-        unitVec = defensePaths.BaseballSeams(step, numSeams, B=0.4)
-        unitVec.normalize()
-        position = unitVec * radius * 250 + centralObject.modelNode.getPos()
-        drone = SpaceJamClasses.Drone(self.loader, "./Assets/DroneDefender/DroneDefender.obj", self.render, droneName, 
-                                      "./Assets/DroneDefender/octotoad1_auv.png", position, 5)
-        drone.modelNode.reparentTo(self.render)
-
-    def DrawCloudDefense(self, centralObject, droneName):
-        unitVec = defensePaths.Cloud()
-        unitVec.normalize()
-        position = unitVec * 500 + centralObject.modelNode.getPos()
-        drone = SpaceJamClasses.Drone(self.loader, "./Assets/DroneDefender/DroneDefender.obj", self.render, droneName, 
-                                      "./Assets/DroneDefender/octotoad1_auv.png", position, 10)
-        drone.modelNode.reparentTo(self.render)
-        
-    def SpawnDronesTask(self, task):
-        if SpaceJamClasses.Drone.droneCount >= 60:
-            return task.done
-        
-        SpaceJamClasses.Drone.droneCount += 1
-        nickName = f"Drone{SpaceJamClasses.Drone.droneCount}"
-        
-        if SpaceJamClasses.Drone.droneCount % 2 == 0:
-            self.DrawCloudDefense(self.Planet1, nickName)
-        else:
-            self.DrawBaseballSeams(self.SpaceStation1, nickName, SpaceJamClasses.Drone.droneCount, 60, 2)
-        
-        return task.cont
-
-app = MyApp()
-app.run()
\ No newline at end of file
+        # Bodies and drone formations come from the scene file; each body is also an attribute, e.g. self.Planet1.
+        self.scene = SceneFile()
+        for name, body in self.scene.BuildBodies(self.loader, self.render).items():
+            setattr(self, name, body)
+
+    def SpawnDrones(self):
+        # Run as a simulation job, so each tick spawns at most drone-spawn-per-tick drones.
+        for _ in self.scene.SpawnFormations(self.loader, self.render, droneSpawnPerTick.getValue()):
+            yield
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fly the ship. Panda3D settings come from the usual .prc files.")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long imports and each startup phase took, and when the first frame was drawn")
+    args = parser.parse_args(argv)
+
+    app = MyApp(startupReport=args.startup_report)
+    app.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
\ No newline at end of file
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+import sys, time
+
+# Imported before anything else at startup, so it sticks to the standard library: the imports it times
+# include panda3d's own.
+
+
+class ImportTimer:
+    """A meta path finder that times every module executed while it is installed. Times are inclusive, like
+    the cumulative column of python -X importtime, and depth 0 is a module the timed code imported itself."""
+
+    def __init__(self):
+        self.imports = []  # (name, depth, seconds) in the order the imports finished
+        self.depth = 0
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        # Built-in and frozen modules are loaded by a class rather than an instance and take no time worth timing.
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            loader.exec_module = self.Timed(name, loader.exec_module)
+        return spec
+
+    def Timed(self, name: str, execModule):
+        def exec_module(module):
+            depth = self.depth
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                execModule(module)
+            finally:
+                self.depth = depth
+                self.imports.append((name, depth, time.perf_counter() - start))
+        return exec_module
+
+
+class StartupTimer:
+    """Records how long startup spends in imports and in each phase of building the game, and when the first
+    frame was drawn. Phases are always recorded, which costs a clock read each; imports only once asked to."""
+
+    def __init__(self):
+        self.began = time.perf_counter()
+        self.phases = []  # (name, seconds) in the order they ran
+        self.importTimer = None
+        self.firstFrame = None
+
+    def TimeImports(self):
+        if self.importTimer is None:
+            self.importTimer = ImportTimer()
+            sys.meta_path.insert(0, self.importTimer)
+
+    def StopImports(self):
+        if self.importTimer in sys.meta_path:
+            sys.meta_path.remove(self.importTimer)
+
+    @contextmanager
+    def Phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def FirstFrame(self):
+        if self.firstFrame is None:
+            self.firstFrame = time.perf_counter() - self.began
+
+    def Summary(self) -> dict:
+        phases = {}
+        for name, seconds in self.phases:
+            phases[name] = phases.get(name, 0) + seconds * 1000
+        imports = {}
+        if self.importTimer is not None:
+            imports = {name: seconds * 1000 for name, depth, seconds in self.importTimer.imports if depth == 0}
+        return {"importsMs": imports, "phasesMs": phases,
+                "firstFrameMs": self.firstFrame * 1000 if self.firstFrame is not None else None}
+
+    def Report(self, limit: int = 16) -> str:
+        summary = self.Summary()
+        lines = []
+        if self.importTimer is not None:
+            imports = summary["importsMs"]
+            lines.append("%-32s %9s" % ("import", "ms"))
+            for name in sorted(imports, key=imports.get, reverse=True)[:limit]:
+                lines.append("%-32s %9.1f" % (name[:32], imports[name]))
+            lines.append("%-32s %9.1f" % ("all imports", sum(imports.values())))
+        lines.append("%-32s %9s" % ("phase", "ms"))
+        for name, milliseconds in summary["phasesMs"].items():
+            lines.append("%-32s %9.1f" % (name[:32], milliseconds))
+        if summary["firstFrameMs"] is not None:
+            lines.append("%-32s %9.1f" % ("first frame (since start)", summary["firstFrameMs"]))
+        return "\n".join(lines)
+
+
+startup = StartupTimer()